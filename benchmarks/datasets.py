@@ -0,0 +1,90 @@
+# synthetic datasets for the benchmarks. every generator is seeded, so the same dataset (and the same rendered
+# output) is generated on every run
+import random
+
+
+_WORDS = ('the quick brown fox jumps over lazy dog lorem ipsum dolor sit amet consectetur adipiscing elit sed do '
+          'eiusmod tempor incididunt ut labore et dolore magna aliqua volume snapshot replica cluster').split()
+_STATUSES = ['active', 'error', 'pending', 'deleted', 'degraded']
+
+
+def _text(rand, min_words, max_words):
+    return ' '.join(rand.choice(_WORDS) for _ in xrange(rand.randint(min_words, max_words)))
+
+
+def _uuid(rand):
+    return '%08x-%04x-%04x-%04x-%012x' % (rand.getrandbits(32), rand.getrandbits(16), rand.getrandbits(16),
+                                          rand.getrandbits(16), rand.getrandbits(48))
+
+
+def _ip(rand):
+    return '.'.join(str(rand.randint(0, 255)) for _ in xrange(4))
+
+
+def flat_wide(num_rows=5000, num_columns=12, seed=1):
+    rand = random.Random(seed)
+    rows = []
+    for index in xrange(num_rows):
+        row = {'id': index, 'name': 'object-%d' % index, 'status': rand.choice(_STATUSES)}
+        for column in xrange(num_columns - len(row)):
+            row['field%02d' % column] = rand.choice([rand.randint(0, 10 ** 6), rand.random() * 100, _text(rand, 1, 3), None, True])
+        rows.append(row)
+    return rows
+
+
+def nested(num_rows=300, depth=3, seed=2):
+    rand = random.Random(seed)
+
+    def _node(level):
+        if level == 0:
+            return _text(rand, 1, 4)
+        if rand.random() < 0.5:
+            return {'key%d' % index: _node(level - 1) for index in xrange(rand.randint(1, 3))}
+        return [{'name': _text(rand, 1, 2), 'value': _node(level - 1)} for _ in xrange(rand.randint(1, 3))]
+    return [{'id': index, 'name': 'object-%d' % index, 'spec': _node(depth), 'tags': [_text(rand, 1, 1) for _ in xrange(3)]}
+            for index in xrange(num_rows)]
+
+
+def uuid_heavy(num_rows=3000, seed=3):
+    rand = random.Random(seed)
+    return [{'id': _uuid(rand), 'volume_id': _uuid(rand), 'checksum': '%032x' % rand.getrandbits(128),
+             'address': _ip(rand), 'name': _text(rand, 1, 3), 'status': rand.choice(_STATUSES)}
+            for _ in xrange(num_rows)]
+
+
+def long_text(num_rows=1000, seed=4):
+    rand = random.Random(seed)
+    return [{'id': index, 'name': _text(rand, 1, 3), 'description': _text(rand, 20, 80), 'notes': _text(rand, 5, 30)}
+            for index in xrange(num_rows)]
+
+
+def many_columns(num_rows=1000, num_columns=40, seed=5):
+    rand = random.Random(seed)
+    return [dict([('id', index)] + [('column%02d' % column, _text(rand, 1, 2)) for column in xrange(num_columns)])
+            for index in xrange(num_rows)]
+
+
+def few_objects(num_rows=20, num_columns=15, seed=6):
+    rand = random.Random(seed)
+    return [dict([('id', _uuid(rand)), ('name', _text(rand, 1, 3))] +
+                 [('property%02d' % column, _text(rand, 1, 6)) for column in xrange(num_columns)])
+            for _ in xrange(num_rows)]
+
+
+def wide_objects(num_rows=4, num_columns=3000, seed=8):
+    rand = random.Random(seed)
+    return [dict([('id', _uuid(rand)), ('name', _text(rand, 1, 3))] +
+                 [('attribute%04d' % column, rand.choice([_text(rand, 1, 4), rand.randint(0, 10 ** 6), {'size': rand.randint(0, 100)}]))
+                  for column in xrange(num_columns)])
+            for _ in xrange(num_rows)]
+
+
+def colored(num_rows=5000, seed=7):
+    rand = random.Random(seed)
+    return [{'id': index, 'name': 'object-%d' % index, 'status': rand.choice(_STATUSES), 'state': rand.choice(['up', 'down']),
+             'description': _text(rand, 1, 10)}
+            for index in xrange(num_rows)]
+
+
+COLORS = {'status': {'active': '\033[32;1m', 'error': '\033[31;1m', 'degraded': '\033[33m'},
+          'state': {'down': '\033[31m'}}
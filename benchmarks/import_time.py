@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# measures the time it takes to import the cliff formatter entry point in a new interpreter, over the time it takes
+# to import its cliff base classes, and fails if it is over the budget or if the entry point imports the formatting
+# modules
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+
+ENTRY_POINT = 'cliff_adaptive_table.cliff_adaptive_table'
+LAZY_MODULES = ['cliff_adaptive_table.adaptive_table', 'cliff_adaptive_table.filter_data', 'cliff_adaptive_table.record_writer',
+                'cliff_adaptive_table.async_format']
+BASE_MODULE = 'cliff.formatters.base'
+DEFAULT_BUDGET_MS = 10.0
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT] + filter(None, [os.environ.get('PYTHONPATH')])))
+    start = time.time()
+    output = subprocess.check_output([sys.executable, '-c', code], env=env)
+    return time.time() - start, output
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def measure(repeat):
+    startup = _median([_run('import %s' % BASE_MODULE)[0] for _ in xrange(repeat)])
+    entry_point = _median([_run('import %s' % ENTRY_POINT)[0] for _ in xrange(repeat)])
+    _, output = _run('import sys, json\nimport %s\nprint(json.dumps(sorted(sys.modules)))' % ENTRY_POINT)
+    loaded = [module for module in LAZY_MODULES if module in json.loads(output)]
+    return (entry_point - startup) * 1000, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='import time of the cliff formatter entry point')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--repeat', type=int, default=15)
+    args = parser.parse_args()
+    import_ms, loaded = measure(args.repeat)
+    print('%s: %.1fms (budget %.1fms)' % (ENTRY_POINT, import_ms, args.budget_ms))
+    failed = False
+    if loaded:
+        print('imported eagerly: %s' % ', '.join(loaded))
+        failed = True
+    if import_ms > args.budget_ms:
+        print('over budget')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# runs the formatter and filter benchmarks, each scenario in its own interpreter, and reports the time, the
+# allocations and the peak memory of each. the results can be saved as a baseline and compared with one, and the
+# digest of every rendered output is compared with benchmarks/golden.json, so optimizations can't change the output
+import os
+import sys
+import gc
+import json
+import time
+import hashlib
+import argparse
+import StringIO
+import resource
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import datasets  # noqa
+from cliff_adaptive_table.adaptive_table import AdaptiveTable  # noqa
+from cliff_adaptive_table.filter_data import FilterData  # noqa
+from cliff_adaptive_table.record_writer import RecordWriter  # noqa
+
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden.json')
+DEFAULT_THRESHOLD = 0.25
+METRICS = ('time_ms', 'gc_objects', 'peak_kb')
+
+
+class Scenario(object):
+    def __init__(self, dataset, modifiers=(), width=120, color_dict=None, filter_only=False, record_format=None):
+        self.dataset = dataset
+        self.modifiers = list(modifiers)
+        self.width = width
+        self.color_dict = color_dict
+        self.filter_only = filter_only
+        self.record_format = record_format
+
+    def run(self, data):
+        filter_data = FilterData()
+        table_modifiers = filter_data.parse_modifiers(self.modifiers)
+        if self.record_format:
+            output = StringIO.StringIO()
+            RecordWriter(self.record_format).write_rows(filter_data.filter_rows(data), output)
+            return output.getvalue()
+        data = filter_data.filter_data(data)
+        if self.filter_only:
+            return json.dumps(data, sort_keys=True)
+        table = AdaptiveTable(color_dict=self.color_dict, width=self.width, ttl=None)
+        table.parse_modifiers(table_modifiers)
+        return table.format(data)
+
+
+SCENARIOS = {
+    'flat-wide': Scenario(datasets.flat_wide, width=200),
+    'flat-narrow': Scenario(datasets.flat_wide, width=100),
+    'nested': Scenario(datasets.nested, width=160),
+    'deep-nested': Scenario(lambda: datasets.nested(num_rows=100, depth=6), width=120),
+    'max-depth': Scenario(lambda: datasets.nested(num_rows=100, depth=6), ['max-depth=3'], width=120),
+    'uuid-heavy': Scenario(datasets.uuid_heavy, width=120),
+    'long-text': Scenario(datasets.long_text, width=100),
+    'split-table': Scenario(datasets.many_columns, ['split-table=true'], width=120),
+    'transpose': Scenario(datasets.few_objects, ['transpose=true'], width=160),
+    'wide-objects': Scenario(datasets.wide_objects, ['split-table=true'], width=160, color_dict=datasets.COLORS),
+    'transpose-wide': Scenario(datasets.wide_objects, ['transpose=true', 'split-table=true'], width=160, color_dict=datasets.COLORS),
+    'csv': Scenario(datasets.flat_wide, record_format='csv'),
+    'ndjson': Scenario(datasets.nested, record_format='ndjson'),
+    'colored': Scenario(datasets.colored, width=120, color_dict=datasets.COLORS),
+    'filter': Scenario(lambda: datasets.flat_wide(num_rows=50000), ['grep=error|degraded', 'columns-v=field0[0-4]', 'sort=d:id', 'top=100'],
+                       filter_only=True),
+}
+
+
+def _peak_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(name, repeat):
+    # Python 2 has no tracemalloc, so the allocations are counted as the objects tracked by the garbage collector
+    # that were allocated and not freed by the end of a run, including cyclic garbage. the peak memory is the
+    # growth of the peak RSS of this process.
+    scenario = SCENARIOS[name]
+    data = scenario.dataset()
+    gc.collect()
+    peak_before = _peak_kb()
+    times = []
+    for _ in xrange(repeat):
+        start = time.time()
+        output = scenario.run(data)
+        times.append(time.time() - start)
+    peak_kb = _peak_kb() - peak_before
+    gc.collect()
+    gc.disable()
+    try:
+        gc_objects = gc.get_count()[0]
+        scenario.run(data)
+        gc_objects = gc.get_count()[0] - gc_objects
+    finally:
+        gc.enable()
+    if isinstance(output, unicode):
+        output = output.encode('utf8')
+    return {'time_ms': sorted(times)[len(times) // 2] * 1000, 'gc_objects': gc_objects, 'peak_kb': peak_kb,
+            'digest': hashlib.sha256(output).hexdigest()}
+
+
+def _measure_in_subprocess(name, repeat):
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child', name, '--repeat', str(repeat)])
+    return json.loads(output)
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save(path, content):
+    with open(path, 'w') as f:
+        json.dump(content, f, indent=4, sort_keys=True)
+        f.write('\n')
+
+
+def _regressions(results, baseline, threshold):
+    regressions = []
+    for name, result in sorted(results.iteritems()):
+        for metric in METRICS:
+            base = baseline.get(name, {}).get(metric)
+            if base and result[metric] > base * (1 + threshold):
+                regressions.append('%s: %s %.0f -> %.0f (+%.0f%%)' % (name, metric, base, result[metric], (result[metric] / float(base) - 1) * 100))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmarks of the adaptive table formatter and filter')
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS), help='run only these scenarios')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', metavar='FILE', help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='relative increase reported as a regression')
+    parser.add_argument('--update-golden', action='store_true', help='save the digests of the outputs as the golden ones')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(args.child, args.repeat)))
+        return 0
+
+    golden = {} if args.update_golden or not os.path.exists(GOLDEN_FILE) else _load(GOLDEN_FILE)
+    results = {}
+    failed = False
+    print('%-12s %10s %12s %10s  %s' % ('scenario', 'time ms', 'gc objects', 'peak KB', 'output'))
+    for name in args.scenario or sorted(SCENARIOS):
+        result = _measure_in_subprocess(name, args.repeat)
+        results[name] = result
+        if name not in golden:
+            status = 'new'
+        elif golden[name] == result['digest']:
+            status = 'ok'
+        else:
+            status = 'CHANGED'
+            failed = True
+        print('%-12s %10.1f %12d %10d  %s' % (name, result['time_ms'], result['gc_objects'], result['peak_kb'], status))
+
+    if args.update_golden:
+        golden = {} if not os.path.exists(GOLDEN_FILE) else _load(GOLDEN_FILE)
+        golden.update((name, result['digest']) for name, result in results.iteritems())
+        _save(GOLDEN_FILE, golden)
+    if args.save:
+        _save(args.save, results)
+    if args.compare:
+        regressions = _regressions(results, _load(args.compare), args.threshold)
+        for regression in regressions:
+            print('regression: %s' % regression)
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,21 @@
-import re
-import time
-import uuid
+import contextlib
+import copy
+import itertools
 import json
-import fcntl
-import struct
-import termios
-from string import hexdigits
+import numbers
+import threading
+import time
 
-from adaptive_table_def import AdaptiveTableDef
+from adaptive_table_def import AdaptiveTableDef, TableRow, TransposedView, pack_columns, text_width
+from color_rules import ColorRules
+from adaptive_table_layout import AdaptiveTableLayout, LayoutPlan
+from deadline import Deadline, FormatCancelled, LayoutTimeout
+from stats import Stats, write_stats
+from key_order import DEFAULT_COLUMN_ORDER, KeyOrder
+from id_classifier import DEFAULT_ID_PATTERNS, ID_PATTERNS, get_id_classifier
+from word_wrap import WrapCache, simple_split
 import modifier
+import terminal
 
 
 class SplitWords(object):
@@ -18,6 +25,13 @@ class SplitWords(object):
     NEVER = 'never'
 
 
+class Degradation(object):
+    NONE = 'none'
+    PARTIAL_LAYOUT = 'partial-layout'  # time ran out, so the best fitting table found so far was displayed
+    NO_FIT = 'no-fit'  # no table fits the width, so each row was displayed in one line
+    QUICKEST = 'quickest'  # no fitting table was found in time, so each row was displayed in one line
+
+
 ADAPTIVE_TABLE_HELP = {
     'description': 'Valid Boolean values are true, t, yes, y, false, f, no, and n (case-insensitive).',
     'modifiers':
@@ -32,6 +46,11 @@ ADAPTIVE_TABLE_HELP = {
             'description': 'When output exceeds terminal width, determines whether to split it into multiple, terminal-width tables, each containing some of the columns.',
             'default': 'false'
             },
+        {
+            'modifier': 'split-table-balanced=<bool>',
+            'description': 'When the table is split (see split-table), determines whether to give the split tables similar widths instead of filling each one up to the terminal width. The number of tables stays the same.',
+            'default': 'false'
+        },
         {
             'modifier': 'column-order=<csv>',
             'description': 'Displays the columns according to a comma-separated list of column headers. The unlisted columns are displayed after the listed ones in alphabetical order.',
@@ -54,101 +73,210 @@ ADAPTIVE_TABLE_HELP = {
             'examples':
             [
                 'standard - Cell values are split only between words. Words are not split unless a word is longer than the cell width.',
-                'except-ids - Same as standard except that UUIDs and IPv4 addresses are never split.',
+                'except-ids - Same as standard except that IDs (see id-patterns) are never split.',
                 'always - Cell values may be split both between words and within words. This may result in slightly shorter tables.',
                 'never - Cell values are never split. This causes the table to look like the output of the regular table formatter.'
             ]
         },
+        {
+            'modifier': 'id-patterns=<csv>',
+            'description': 'Determines which values are considered IDs by split-words=except-ids. The valid kinds are hex (32, 40 or 64 hexadecimal digits), uuid, ipv4, ipv6 and mac.',
+            'default': 'hex,uuid,ipv4,ipv6,mac'
+        },
+        {
+            'modifier': 'id-regex=<pattern>',
+            'description': 'Also considers values that entirely match the pattern as IDs. If repeated, values matching any of the patterns are considered IDs.',
+        },
         {
             'modifier': 'width=<n>',
             'description': 'Sets the width of the terminal to n characters instead of using the auto-detected value.',
             'default': 'auto-detected value'
         },
+        {
+            'modifier': 'non-tty-width=<n>',
+            'description': 'Sets the width used when the output is not a terminal, e.g. when it is piped to a file, and the COLUMNS environment variable is not set.',
+            'default': '200'
+        },
         {
             'modifier': 'transpose=<bool>',
             'description': 'Rotates the table, turning the rows into columns and the columns into rows. Useful when there are few complex objects.',
             'default': 'false',
         },
+        {
+            'modifier': 'max-depth=<n>',
+            'description': 'Displays the values nested in more than n levels of tables as JSON, wrapped to the width of their column, instead of sub-tables. The top level table is the first level, so 1 displays no sub-tables. n must be at least 1. Limits the time spent on deeply nested values.',
+            'default': 'unlimited',
+        },
         {
             'modifier': 'count=<bool>',
             'description': 'Displays the number of objects in the table.',
             'default': 'false',
         },
+        {
+            'modifier': 'workers=<n>',
+            'description': 'Formats the nested values of large tables in n processes. Only the rendering of the cells is split between the processes; the column widths are still found in the current process, and the processes are started for each table. It is often slower than 1 unless there are many CPUs and thousands of nested values, so measure it first. Tables with few nested values, and tables formatted by a process with other threads (e.g. by aformat), are formatted in the current process.',
+            'default': '1',
+        },
+        {
+            'modifier': 'stream=<bool>',
+            'description': 'Displays the rows of a list as soon as they are formatted. The columns are sized according to the first rows (see stream-sample), and longer values in later rows are cut to the column width. Only the columns of the first rows are displayed, and split-table and transpose are ignored. Note: tail and sort still read all the rows before displaying them.',
+            'default': 'false',
+        },
+        {
+            'modifier': 'stream-sample=<n>',
+            'description': 'Sets the number of rows used to size the columns of a streamed table.',
+            'default': '100',
+        },
+        {
+            'modifier': 'stats=<bool>',
+            'description': 'Writes the timings of the formatting phases (filter, colors, layout, render and write), each layout probe, the chosen string length and whether the table was degraded to stderr as one line of JSON.',
+            'default': 'false',
+        },
+        {
+            'modifier': 'stats-file=<path>',
+            'description': 'Appends the stats (see stats) to the file instead of writing them to stderr. Implies stats=true.',
+        },
     ]
 }
 
 
+_JSON_FLOATS = {'nan': 'NaN', 'inf': 'Infinity', '-inf': '-Infinity'}  # the repr of the floats json.dumps formats differently
+
+
+class _FlatColumn(object):
+    # the values of a column of a list of dicts of scalars and their types. the cells of the values are formatted
+    # without a max_str_length once, and are shared by the layout and the formatting of the table
+    __slots__ = ('values', 'types', 'all_strings', 'has_strings', 'cells')
+
+    def __init__(self, values, types):
+        self.values = values
+        self.types = types
+        self.all_strings = all(issubclass(value_type, basestring) for value_type in types)
+        self.has_strings = any(issubclass(value_type, basestring) for value_type in types)
+        self.cells = None
+
+
 class AdaptiveTable(object):
     _MODIFIERS = {'width': modifier.to_int,
+                  'non-tty-width': modifier.to_int,
                   'force-frames': modifier.boolean,
                   'horizontal-lines': modifier.boolean,
                   'split-words': modifier.to_str,
+                  'id-patterns': modifier.choices_csv(ID_PATTERNS),
+                  'id-regex': modifier.append_regex,
                   'column-order': modifier.csv,
                   'split-table': modifier.boolean,
+                  'split-table-balanced': modifier.boolean,
                   'color': modifier.boolean,
                   'transpose': modifier.boolean,
-                  'count': modifier.boolean}
-    _DEFAULT_COLUMN_ORDER = ['id', 'name', 'status', 'state']
-    _IP_PATTERN = re.compile('^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}$')
+                  'max-depth': modifier.positive_int,
+                  'count': modifier.boolean,
+                  'workers': modifier.to_int,
+                  'stream': modifier.boolean,
+                  'stream-sample': modifier.to_int,
+                  'stats': modifier.boolean,
+                  'stats-file': modifier.to_str}
+    _DEFAULT_COLUMN_ORDER = DEFAULT_COLUMN_ORDER
     _TTL = 1.0  # maximum time to try to optimize the table
+    _STREAM_SAMPLE = 100  # number of rows used to size the columns of a streamed table
+    _NON_TTY_WIDTH = 200  # width of tables that are not written to a terminal
+    _NON_TTY_HEIGHT = 1000
+    _WORKERS_MIN_NESTED = 500  # minimum number of nested values to format in worker processes
+    _WORKER_STATE_EXCLUDED = ('_key_order', '_list_keys', '_wrap_cache', '_id_classifier', '_color_dict', '_color_rules', '_layout_plan', '_flat_columns',
+                              '_stats_hook', '_stats_collector', '_cancelled')
+    _JOB_RESULTS = ('_layout_plan', '_degradation', '_num_objects', '_stats_collector')  # copied back from a table formatted in another thread
+    _SETTINGS = ('_max_depth', '_split_words', '_split_table', '_transpose')  # changed while formatting a table that doesn't fit
 
     def __init__(self,
                  color_dict=None,
                  color=True,
                  width=None,
+                 non_tty_width=_NON_TTY_WIDTH,
                  split_table=None,
+                 split_table_balanced=False,
                  max_depth=None,
                  force_frames=False,
                  horizontal_lines=False,
                  split_words=SplitWords.EXCEPT_IDS,
+                 id_patterns=DEFAULT_ID_PATTERNS,
+                 id_regex=(),
                  column_order=_DEFAULT_COLUMN_ORDER,
                  transpose=False,
                  count=False,
-                 ttl=_TTL):
+                 workers=1,
+                 stream=False,
+                 stream_sample=_STREAM_SAMPLE,
+                 ttl=_TTL,
+                 stats=False,
+                 stats_file=None,
+                 stats_hook=None):
         self._color_dict = color_dict or {}
+        self._color_rules = None
         self._color = color
-        self._width = width or self._get_terminal_size()[1]
+        self._non_tty_width = non_tty_width
+        self._auto_width = not width  # the width follows the terminal, which may be resized between tables
+        self._width = width or self._get_terminal_width()
         self._split_table = split_table
+        self._split_table_balanced = split_table_balanced
         self._max_depth = max_depth
         self._force_frames = force_frames
         self._split_words = split_words
+        self._id_patterns = id_patterns
+        self._id_regex = id_regex
+        self._id_classifier = None
+        self._wrap_cache = WrapCache()
         self._horizontal_lines = horizontal_lines
         self._column_order = column_order or self._DEFAULT_COLUMN_ORDER
         self._transpose = transpose
         self._transposable = True
         self._count = count
         self._num_objects = None
-        self._set_key_sorter()
-        if ttl is None:
-            self._timeout = None
-        else:
-            self._timeout = time.time() + ttl
+        self._workers = workers
+        self._stream = stream
+        self._stream_sample = stream_sample
+        self._set_key_order()
+        self._ttl = ttl
+        self._cancelled = None  # an event that is set to stop formatting the table in another thread
+        self._deadline = self._make_deadline(ttl)
+        self._layout_plan = None
+        self._flat_columns = None
+        self._list_keys = None
+        self._degradation = Degradation.NONE
+        self._stats = stats
+        self._stats_file = stats_file
+        self._stats_hook = stats_hook  # called with the stats of every table by report_stats()
+        self._stats_collector = None
 
     def parse_modifiers(self, args):
         recognized, unrecognized = modifier.parse_modifiers(self._MODIFIERS, args)
         for key, value in recognized.iteritems():
             setattr(self, '_' + key.replace('-', '_'), value)
-        self._set_key_sorter()
+        if 'width' in recognized:
+            self._auto_width = False
+        self._set_key_order()
+        self._id_classifier = None
+        self._layout_plan = None
         return unrecognized
 
     def get_modifier_names(self):
         return self._MODIFIERS.keys()
 
-    def _set_key_sorter(self):
-        if self._column_order:
-            column_value = {key.lower(): index - len(self._column_order) for index, key in enumerate(self._column_order)}
-            self._key_sorter = lambda item: [column_value.get(unicode(item).lower(), 0), item]
-        else:
-            self._key_sorter = lambda item: item
+    def _set_key_order(self):
+        self._key_order = KeyOrder(self._column_order)
+
+    def _make_deadline(self, ttl=None):
+        return Deadline(ttl, self._cancelled)
 
-    def _format_table(self, raw_headers, raw_data, all_colors, depth, compact):
+    def _format_table(self, raw_headers, raw_data, all_colors, depth, compact, prepared=None):
+        if self._stats_collector is not None:
+            self._stats_collector.add_table(depth)
         if not raw_data:
             return unicode(raw_data)
 
         transpose = (depth == 0 and self._transpose and self._transposable)
 
         if transpose:
-            transposed = self._transpose_table(raw_data)
+            transposed = TransposedView(raw_data)
             headers = []
             vertical = True
             header_width = max(max(len(row) for row in header.split('\n')) for header in raw_headers) if raw_headers else 0
@@ -158,186 +286,221 @@ class AdaptiveTable(object):
             vertical = not raw_headers
             header_width = max(len(header) for header in raw_headers) if raw_headers else 0
 
-        all_data, all_widths = self._prepare_data_for_formatting(headers, transposed or raw_data)
+        all_data, all_widths = prepared or self._prepare_data_for_formatting(headers, transposed or raw_data)
 
         lines = []
-        first_column = 0
-        while raw_headers is None or first_column < len(all_data[0]):
-            if depth == 0 and raw_headers and self._split_table:
-                last_column = len(raw_headers) + 1
-                last_column = len(all_data[0]) + 1
-                while last_column > first_column:
-                    if self._timeout and time.time() > self._timeout:
-                        raise RuntimeError
-                    widths = all_widths[first_column:last_column]
-                    if transpose:
-                        widths = [header_width] + widths
-                    indent = 0 if first_column == 0 or transposed else 2
-                    table_def = AdaptiveTableDef(widths, depth, compact, self._force_frames, self._horizontal_lines, indent, self._transpose, vertical, raw_headers[first_column:last_column])
-                    if table_def.total_width() <= self._width or first_column + 1 == last_column:
-                        if transpose:
-                            data = [[raw_headers[index].split('\n')] + one_row[first_column:last_column] for index, one_row in enumerate(all_data)]
-                        else:
-                            data = [one_row[first_column:last_column] for one_row in all_data]
-                        if all_colors:
-                            if transpose:
-                                colors = [[None] + one_row[first_column:last_column] for one_row in all_colors]
-                            else:
-                                colors = [one_row[first_column:last_column] for one_row in all_colors]
-                        else:
-                            colors = None
-                        first_column = last_column
-                        break
-                    last_column -= 1
-            else:
-                if depth == 0 and all_colors:
-                    if transpose:
-                        colors = [[None] + row for row in all_colors]
-                    else:
-                        colors = all_colors
-                else:
-                    colors = None
+        if depth == 0 and raw_headers and self._split_table:
+            chunks = pack_columns(all_widths, self._width, compact, 0 if transpose else 2,
+                                  header_width=header_width if transpose else None, balanced=self._split_table_balanced)
+        elif raw_headers is not None and not all_data[0].cells:
+            chunks = []
+        else:
+            chunks = [None]
+        for chunk in chunks:
+            if chunk:
+                self._deadline.check()
+                first_column, last_column = chunk
+                widths = all_widths[first_column:last_column]
                 if transpose:
-                    data = [[raw_headers[index].split('\n')] + one_row for index, one_row in enumerate(all_data)]
-                    widths = [header_width] + all_widths
-                else:
-                    data = all_data
-                    widths = all_widths
+                    widths = [header_width] + widths
+                indent = 0 if first_column == 0 or transposed else 2
+                table_def = AdaptiveTableDef(widths, depth, compact, self._force_frames, self._horizontal_lines, indent, self._transpose, vertical, raw_headers[first_column:last_column])
+                colors = all_colors
+            else:
+                first_column = last_column = None
+                widths = [header_width] + all_widths if transpose else all_widths
                 table_def = AdaptiveTableDef(widths, depth, compact, self._force_frames, self._horizontal_lines, 0, self._transpose, vertical, raw_headers)
+                colors = all_colors if depth == 0 else None
 
             if lines and transpose:
                 lines.append('')
-            self._format_columns(table_def, widths, colors, depth, data, lines)
-            if not raw_headers or depth > 0 or not self._split_table:
-                break
+            # the rows of a chunk are sliced before it is rendered, since interleaving the short-lived rows with the
+            # rendered lines fragments the memory
+            rows = list(self._iter_chunk_rows(all_data, colors, raw_headers if transpose else None, chunk))
+            lines.extend(self._iter_format_columns(table_def, depth, rows))
         if depth == 0 and self._num_objects is not None:
             lines.extend(['', 'object count: %s' % self._num_objects])
         return '\n'.join(lines)
 
+    def _iter_chunk_rows(self, all_data, all_colors, row_headers, chunk):
+        # the rows and colors of the columns of a chunk (all the columns if chunk is None). row_headers are added
+        # as the first column of a transposed table
+        first_column, last_column = chunk or (None, None)
+        for index, row in enumerate(all_data):
+            colors = all_colors[index] if all_colors else None
+            if chunk:
+                row = TableRow(row.cells[first_column:last_column])
+                if colors is not None:
+                    colors = colors[first_column:last_column]
+            if row_headers is not None:
+                row = TableRow([row_headers[index]] + row.cells)
+                if colors is not None:
+                    colors = [None] + list(colors)
+            yield row, colors
+
     def _prepare_data_for_formatting(self, headers, raw_data):
         all_widths = [0] * max(len(datum) for datum in raw_data)
         all_data = []
-        if headers:
-            raw_data = [headers] + raw_data
-        for raw_row in raw_data:
-            row = [unicode(item).split('\n') for item in raw_row]
-            for index, item in enumerate(row):
-                all_widths[index] = max(all_widths[index], max(len(line) for line in item))
-            all_data.append(row)
+        for raw_row in itertools.chain([headers], raw_data) if headers else raw_data:
+            cells = [unicode(item) for item in raw_row]
+            for index, cell in enumerate(cells):
+                width = text_width(cell)
+                if width > all_widths[index]:
+                    all_widths[index] = width
+            all_data.append(TableRow(cells))
         return all_data, all_widths
 
-    def _format_columns(self, table_def, widths, colors, depth, data, lines):
-        def _add_color_keep_width(string, color_prefix, width):
-            if not color_prefix:
-                return string
-            else:
-                return ''.join((color_prefix, string, '\033[0m', ' ' * (width - len(string))))
-
-        def _add_color_to_row(row_index, colors, widths, row):
-            if not colors or not colors[row_index]:
-                return row
-            row_colors = colors[row_index]
-            color_row = []
-            for column_index, value in enumerate(row):
-                if column_index < len(row_colors):
-                    value = [_add_color_keep_width(item, row_colors[column_index], widths[column_index]) for item in value]
-                color_row.append(value)
-            return color_row
-
+    def _iter_format_columns(self, table_def, depth, rows):
         prev_max_lines = 0
-        for row_index, row in enumerate(data):
-            max_lines = max(len(item) for item in row)
-            sep = table_def.get_separator(row_index, max_lines, prev_max_lines)
+        for row_index, (row, row_colors) in enumerate(rows):
+            self._deadline.check()
+            sep = table_def.get_separator(row_index, row.height, prev_max_lines)
             if sep:
-                lines.append(sep)
-            for index in xrange(max_lines):
-                row = _add_color_to_row(row_index, colors, widths, row)
-                row = row + [''] * (len(widths) - len(row))
-                lines.append(table_def.line_format % tuple(self._get_line(item, index) for item in row))
-            prev_max_lines = max_lines
+                yield sep
+            for line in table_def.render_row(row, row_colors):
+                yield line
+            prev_max_lines = row.height
         if depth == 0 or self._force_frames:
-            lines.append(table_def.get_end_separator())
+            yield table_def.get_end_separator()
 
-    def _get_line(self, lines, index):
-        return lines[index] if index < len(lines) else ''
+    def _get_id_classifier(self):
+        if self._id_classifier is None:
+            self._id_classifier = get_id_classifier(self._id_patterns, self._id_regex)
+        return self._id_classifier
 
     def _split_string(self, string, max_str_length):
-        def _simple_split(string, max_str_length):
-            return [string[0 + i:max_str_length + i] for i in range(0, len(string), max_str_length)]
-
-        def _append_word(line, word):
-            if line:
-                line += ' '
-            line += word
-            return line
-
-        def _should_not_be_split(value):
-            if len(value) in (32, 64) and not value.lstrip(hexdigits):
-                return True
-            if len(value) in (32, 36):
-                try:
-                    uuid.UUID(value)
-                    return True
-                except:
-                    pass
-            return bool(self._IP_PATTERN.match(value))
-
         string = unicode(string)
         if not max_str_length or self._split_words == SplitWords.NEVER:
             return string
-        if self._split_words == SplitWords.ALWAYS:
-            return '\n'.join(_simple_split(string, max_str_length))
-        if self._split_words == SplitWords.EXCEPT_IDS and _should_not_be_split(string):
-            return string
-        lines = []
-        current_line = ''
-        for word in string.split():
-            if len(_append_word(current_line, word)) <= max_str_length:
-                current_line = _append_word(current_line, word)
+        if len(string) <= max_str_length and (self._split_words == SplitWords.ALWAYS or ' '.join(string.split()) == string):
+            return string  # it fits in one line, and no whitespace is collapsed by wrapping it
+        key = (string, max_str_length, self._split_words)
+        result = self._wrap_cache.get(key)
+        if result is None:
+            if self._split_words == SplitWords.ALWAYS:
+                result = '\n'.join(simple_split(string, max_str_length))
+            elif self._split_words == SplitWords.EXCEPT_IDS and self._get_id_classifier().is_id(string):
+                result = string
             else:
-                if len(word) <= max_str_length:
-                    if current_line:
-                        lines.append(current_line)
-                    current_line = word
-                else:
-                    if self._split_words in (SplitWords.EXCEPT_IDS, SplitWords.STANDARD):
-                        space_left = max(0, max_str_length - len(current_line) - (1 if current_line else 0))
-                        if space_left:
-                            lines.append(_append_word(current_line, word[:space_left]))
-                        else:
-                            if current_line:
-                                lines.append(current_line)
-                        sub_lines = _simple_split(word[space_left:], max_str_length)
-                        lines.extend(sub_lines[:-1])
-                        current_line = sub_lines[-1]
-                    else:
-                        lines.append(word)
-                        current_line = ''
-
-        if current_line:
-            lines.append(current_line)
-        return '\n'.join(lines)
+                split_long_words = self._split_words in (SplitWords.EXCEPT_IDS, SplitWords.STANDARD)
+                result = '\n'.join(self._wrap_cache.words(string).wrap(max_str_length, split_long_words))
+            self._wrap_cache.put(key, result)
+        return result
+
+    def _one_line_limit(self, string):
+        # the shortest max_str_length with which _split_string keeps the string in one line, and its width then
+        string = unicode(string)
+        if self._split_words == SplitWords.NEVER or (self._split_words == SplitWords.EXCEPT_IDS and self._get_id_classifier().is_id(string)):
+            return 0, text_width(string)
+        if self._split_words == SplitWords.ALWAYS:
+            return len(string), text_width(string)
+        width = len(' '.join(string.split()))
+        return width, width
+
+    def _wraps_to_limit(self):
+        # whether strings longer than max_str_length are always split into lines of at most max_str_length
+        return self._split_words in (SplitWords.ALWAYS, SplitWords.EXCEPT_IDS, SplitWords.STANDARD)
+
+    def _get_flat_columns(self, data, keys):
+        # the values of a list of dicts of scalars and their types, column by column, or None if the list has other
+        # values. the columns are kept for the layout and the formatting of the same list
+        if self._flat_columns is not None and self._flat_columns[0] is data:
+            return self._flat_columns[1]
+        columns = None
+        if all(issubclass(item_type, dict) for item_type in set(map(type, data))):
+            columns = []
+            for key in keys:
+                self._deadline.check_now()
+                values = [item.get(key, '') for item in data]
+                types = set(map(type, values))
+                if any(issubclass(value_type, (dict, list, tuple)) for value_type in types):
+                    columns = None
+                    break
+                columns.append(_FlatColumn(values, types))
+        self._flat_columns = (data, columns)
+        return columns
+
+    def _format_scalars(self, values, types, max_str_length):
+        # formats scalars like _format_cell does, each distinct value once. values of different numeric types
+        # are formatted one by one, since equal numbers of different types are formatted differently
+        if len(types) == 1 and types.issubset((int, long, float)):
+            cells = self._format_numbers(values, types, max_str_length)
+            if cells is not None:
+                return cells
+        if all(issubclass(value_type, basestring) for value_type in types):
+            formatted = {value: self._split_string(value, max_str_length) for value in set(values)}
+        elif sum(1 for value_type in types if issubclass(value_type, numbers.Number)) <= 1:
+            formatted = {value: unicode(self._format_cell(value, 1, False, max_str_length)) for value in set(values)}
+        else:
+            return [unicode(self._format_cell(value, 1, False, max_str_length)) for value in values]
+        return map(formatted.__getitem__, values)
+
+    def _format_numbers(self, values, types, max_str_length):
+        # formats numbers of one type like _format_cell does, or returns None if they are split. beyond max_depth
+        # numbers are formatted as JSON, which formats ints like unicode and finite floats with repr
+        if self._max_depth is None or self._max_depth > 1:
+            return map(unicode, values)
+        if max_str_length and self._split_words != SplitWords.NEVER:
+            return None
+        if float in types:
+            strings = map(repr, values)
+            return map(unicode, map(_JSON_FLOATS.get, strings, strings))
+        return map(unicode, values)
+
+    def _splits_scalars(self):
+        # beyond max_depth, scalars are formatted as JSON, which is split like strings
+        return self._max_depth is not None and self._max_depth <= 1
+
+    def _get_flat_cells(self, column):
+        if column.cells is None:
+            column.cells = self._format_scalars(column.values, column.types, None)
+        return column.cells
+
+    def _format_flat_column(self, column, max_str_length):
+        # formats a column like _format_scalars does, reusing the cells of the values that are not strings, unless
+        # they are formatted as JSON, which is split by max_str_length
+        if column.all_strings or self._splits_scalars():
+            return self._format_scalars(column.values, column.types, max_str_length)
+        cells = self._get_flat_cells(column)
+        if not column.has_strings or not max_str_length or self._split_words == SplitWords.NEVER:
+            return cells
+        strings = {value: self._split_string(value, max_str_length) for value in set(column.values) if isinstance(value, basestring)}
+        return [strings[value] if isinstance(value, basestring) else cell for value, cell in itertools.izip(column.values, cells)]
+
+    def get_wrap_cache_stats(self):
+        return self._wrap_cache.stats()
 
     def _get_keys_of_a_list_of_dicts(self, data):
-        keys = set()
-        for item in data:
-            if isinstance(item, dict):
-                keys.update(item.iterkeys())
-            else:
-                keys.add('')
-        return sorted(keys, key=self._key_sorter)
+        # the keys of each list are kept while a table is formatted, since they are needed for its layout, its
+        # colors and its rendering
+        if self._list_keys is not None:
+            known = self._list_keys.get(id(data))
+            if known is not None and known[0] is data:
+                return known[1]
+        if set(map(type, data)) == {dict}:  # the common case, whose keys are collected without a loop
+            keys = set().union(*data)
+        else:
+            keys = set()
+            for item in data:
+                if isinstance(item, dict):
+                    keys.update(item.iterkeys())
+                else:
+                    keys.add('')
+        keys = self._key_order.sorted_keys(keys)
+        if self._list_keys is not None:
+            self._list_keys[id(data)] = (data, keys)
+        return keys
 
     def _format_cell(self, data, depth, compact, max_str_length):
-        if self._timeout and time.time() > self._timeout:
-            raise RuntimeError
+        self._deadline.check()
         if isinstance(data, (str, unicode)):
             return self._split_string(data, max_str_length)
         if self._max_depth is not None and depth >= self._max_depth:
-            return json.dumps(data, sort_keys=True)
+            return self._split_string(json.dumps(data, sort_keys=True), max_str_length)
         if isinstance(data, dict):
             if not data:
                 return {}
-            keys = sorted(data.iterkeys(), key=self._key_sorter)
+            keys = self._key_order.sorted_keys(data)
             table = [[self._split_string(key, max_str_length),
                       self._format_cell(data[key], depth + 1, compact, max_str_length)] for key in keys]
             return self._format_table(None, table, None, depth, compact)
@@ -368,7 +531,7 @@ class AdaptiveTable(object):
 
     def _format(self, data, colors, compact, max_str_length):
         if isinstance(data, dict):
-            keys = sorted(data.iterkeys(), key=self._key_sorter)
+            keys = self._key_order.sorted_keys(data)
             table = [[key, self._format_cell(data[key], 1, compact, max_str_length)] for key in keys]
             return self._format_table(None, table, colors, 0, compact)
 
@@ -379,10 +542,11 @@ class AdaptiveTable(object):
             headers = [self._split_string(key, max_str_length) for key in keys]
             num_dicts = len([item for item in data if isinstance(item, dict)])
             if num_dicts > 0:  # if there are dicts, imagine non-dicts are inside dicts with a single empty string key
-                for item in data:
-                    if not isinstance(item, dict):
-                        item = {'': item}
-                    table.append([self._format_cell(item.get(key, ''), 1, compact, max_str_length) for key in keys])
+                columns = None if (self._transpose and self._transposable) or not keys else self._get_flat_columns(data, keys)
+                if columns is not None:  # rows without keys have no columns, and are displayed by the generic path
+                    prepared = self._format_flat_rows(columns, headers, max_str_length)
+                    return self._format_table(headers, prepared[0][1:], colors, 0, compact, prepared)
+                table = self._format_rows(data, keys, compact, max_str_length)
                 return self._format_table(headers, table, colors, 0, compact)
             else:  # only non-dicts in the list
                 table = [[self._format_cell(value, 1, compact, max_str_length)] for value in data]
@@ -390,113 +554,432 @@ class AdaptiveTable(object):
 
         return self._format_cell(data, 1, compact, max_str_length)
 
-    def _get_item_color(self, key, value):
-        if isinstance(key, (str, unicode)) and isinstance(value, (str, unicode)):
-            return self._color_dict.get(key, {}).get(value)
+    def _get_color_rules(self):
+        if self._color_rules is None:
+            self._color_rules = ColorRules(self._color_dict)
+        return self._color_rules
+
+    def _get_row_colors(self, keys, data):
+        if isinstance(data, dict):
+            return self._get_color_rules().row_colors(keys, data)
         return None
 
     def _get_data_colors(self, data):
-        def _get_dict_colors(keys, data):
-            if isinstance(data, dict):
-                return [self._get_item_color(key, data.get(key)) for key in keys]
-            return None
-
         if not self._color:
             return None
         if not data:
             return []
         if isinstance(data, dict):
-            return [[None, color] for color in _get_dict_colors(sorted(data.iterkeys(), key=self._key_sorter), data)]
+            return [[None, color] for color in self._get_row_colors(self._key_order.sorted_keys(data), data)]
         if isinstance(data, (list, tuple)):
             keys = self._get_keys_of_a_list_of_dicts(data)
-            return [[]] + [_get_dict_colors(keys, item) for item in data]
+            if not self._get_color_rules().colorable(keys):
+                return None  # no column is colored
+            return [[]] + [self._get_row_colors(keys, item) for item in data]
         return None
 
     def _adaptive_format(self, data, colors):
-        def table_fits(table, width):
-            table_width = table.find('\n')
-            if table_width < 0:
-                table_width = len(table)
-            return table_width <= width
+        stats = self._stats_collector
+        if stats is None:
+            compact, max_str_length = self._find_layout(data)
+            self._deadline = self._make_deadline()  # the layout is chosen, so the table is displayed even if time runs out
+            return self._format(data, colors, compact, max_str_length)
+        start = time.time()
+        compact, max_str_length = self._find_layout(data)
+        self._deadline = self._make_deadline()
+        stats.add_phase('layout', time.time() - start)
+        self._set_layout_stats(compact, max_str_length)
+        start = time.time()
+        table = self._format(data, colors, compact, max_str_length)
+        stats.add_phase('render', time.time() - start)
+        return table
+
+    def _find_layout(self, data):
+        # the layout of the previous table is reused if this table has the same columns and still fits with it.
+        # if time runs out while searching, the best layout found to fit so far is used
+        shape = self._get_shape(data)
+        fitting = []
+        try:
+            layout = AdaptiveTableLayout(self, data)
+            plan = self._layout_plan
+            if plan is not None and plan.shape == shape and self._layout_width(layout, plan.max_str_length, plan.compact) <= self._width:
+                if self._stats_collector is not None:
+                    self._stats_collector.set('layout_plan_reused', True)
+                return plan.compact, plan.max_str_length
+            compact, max_str_length = self._search_layout(layout, fitting)
+        except LayoutTimeout:
+            if not fitting:
+                raise
+            self._degradation = Degradation.PARTIAL_LAYOUT
+            return fitting[-1]
+        if self._degradation == Degradation.NONE:
+            self._layout_plan = LayoutPlan(shape, compact, max_str_length)
+        return compact, max_str_length
+
+    def _get_shape(self, data):
+        if isinstance(data, dict):
+            keys = self._key_order.sorted_keys(data)
+        elif isinstance(data, (list, tuple)):
+            keys = self._get_keys_of_a_list_of_dicts(data)
+        else:
+            keys = None
+        return type(data), keys, self._width, self._transposable
+
+    def get_layout_plan(self):
+        return self._layout_plan
+
+    def set_layout_plan(self, plan):
+        self._layout_plan = plan
+
+    def _search_layout(self, layout, fitting):
+        # search for the best string length on the measurements of the table
+
+        def table_fits(max_str_length, compact):
+            fits = self._layout_width(layout, max_str_length, compact) <= self._width
+            if fits:
+                fitting.append((compact, max_str_length))
+            return fits
         # first try table without splitting strings
-        table = self._format(data, colors, compact=False, max_str_length=None)
-        if table_fits(table, self._width):
-            return table
+        if table_fits(None, compact=False):
+            return False, None
         lower_limit = 10
         upper_limit = 100
         # find upper limit to string length
-        while True:
-            table = self._format(data, colors, compact=False, max_str_length=upper_limit)
-            if table_fits(table, self._width):
-                lower_limit = upper_limit
-                upper_limit *= 2
-            else:
-                break
+        while table_fits(upper_limit, compact=False):
+            lower_limit = upper_limit
+            upper_limit *= 2
         # find maximum string length with which the table still fits
         max_str_length = (lower_limit + upper_limit) / 2
+        compact_fits = False
         while lower_limit < max_str_length:
             max_str_length = (lower_limit + upper_limit) / 2
-            table = self._format(data, colors, compact=True, max_str_length=max_str_length)
-            if table_fits(table, self._width):
+            compact_fits = table_fits(max_str_length, compact=True)
+            if compact_fits:
                 lower_limit = max_str_length
             else:
                 upper_limit = max_str_length
         # try non-compact table, it often fits
-        non_compact_table = self._format(data, colors, compact=False, max_str_length=max_str_length)
-        if table_fits(non_compact_table, self._width):
-            return non_compact_table
-        if not table_fits(table, self._width):
+        if table_fits(max_str_length, compact=False):
+            return False, max_str_length
+        if not compact_fits:
             # give up, just make sure each row is printed in exactly one line
             self._max_depth = 1
             self._split_words = SplitWords.NEVER
-            table = self._format(data, colors, compact=False, max_str_length=None)
-        return table
-
-    def _transpose_table(self, data):
-        transposed = []
-        for index in xrange(len(data[0])):
-            transposed.append([row[index] for row in data])
-        return transposed
+            self._degradation = Degradation.NO_FIT
+            return False, None
+        return True, max_str_length
+
+    def _layout_width(self, layout, max_str_length, compact):
+        # a probe of the layout search
+        if self._stats_collector is None:
+            return layout.width(max_str_length, compact)
+        start = time.time()
+        width = layout.width(max_str_length, compact)
+        self._stats_collector.add_probe(max_str_length, compact, width, width <= self._width, time.time() - start)
+        return width
 
     def _count_objects(self, data):
         if isinstance(data, (list, tuple, dict)):
             return len(data)
         return 1 if data else 0
 
+    @contextlib.contextmanager
+    def _formatting(self, keep_list_keys=True):
+        # the state of formatting one table. the settings changed while formatting it are restored, and the caches
+        # of its data are dropped. the keys of its lists are not kept for tables of many rows, e.g. streamed tables
+        self._update_width()
+        self._wrap_cache = WrapCache()
+        self._deadline = self._make_deadline(self._ttl)
+        self._degradation = Degradation.NONE
+        self._flat_columns = None
+        self._list_keys = {} if keep_list_keys else None
+        self._start_stats()
+        settings = self._get_settings()
+        try:
+            yield
+        finally:
+            self._flat_columns = None
+            self._list_keys = None
+            self._set_settings(settings)
+            self._end_stats()
+
     def format(self, data):
-        if self._count:
-            self._num_objects = self._count_objects(data)
-        if isinstance(data, (list, tuple)) and len(data) == 1:
-            data = data[0]
-        self._transposable = isinstance(data, (list, tuple))
-        colors = self._get_data_colors(data)
-        orig_colors = colors
-        if colors and self._transpose and self._transposable:
-            colors = self._transpose_table(colors[1:])
+        with self._formatting():
+            if self._count:
+                self._num_objects = self._count_objects(data)
+            if isinstance(data, (list, tuple)) and len(data) == 1:
+                data = data[0]
+            self._transposable = isinstance(data, (list, tuple))
+            start = time.time()
+            colors = self._get_data_colors(data)
+            self.add_stats_phase('colors', time.time() - start)
+            orig_colors = colors
+            if colors and self._transpose and self._transposable:
+                colors = TransposedView(colors, first_row=1)
+            try:
+                return self._adaptive_format(data, colors)
+            except FormatCancelled:
+                raise
+            except:
+                # timeout, just use the quickest table
+                self._set_quickest_table()
+                self._degradation = Degradation.QUICKEST
+                self._set_layout_stats(False, None)
+                start = time.time()
+                table = self._format(data, orig_colors, compact=False, max_str_length=None)
+                self.add_stats_phase('fallback', time.time() - start)
+                return table
+
+    def _get_settings(self):
+        return [getattr(self, name) for name in self._SETTINGS]
+
+    def _set_settings(self, settings):
+        for name, value in zip(self._SETTINGS, settings):
+            setattr(self, name, value)
+
+    def _set_quickest_table(self):
+        self._max_depth = 1
+        self._split_words = SplitWords.NEVER
+        self._split_table = False
+        self._transpose = False
+        self._deadline = self._make_deadline()
+
+    def get_degradation(self):
+        return self._degradation
+
+    def _start_stats(self):
+        enabled = self._stats or self._stats_file or self._stats_hook
+        self._stats_collector = Stats() if enabled else None
+
+    def _set_layout_stats(self, compact, max_str_length):
+        if self._stats_collector is not None:
+            self._stats_collector.set('compact', compact)
+            self._stats_collector.set('max_str_length', max_str_length)
+
+    def _end_stats(self):
+        stats = self._stats_collector
+        if stats is not None:
+            stats.set('width', self._width)
+            stats.set('degradation', self._degradation)
+            stats.set('fallback', self._degradation != Degradation.NONE)
+            stats.set('wrap_cache', self._wrap_cache.stats())
+
+    def add_stats_phase(self, name, seconds):
+        # adds the time of a phase outside of the table, e.g. filtering or writing, to the stats of the last table
+        if self._stats_collector is not None:
+            self._stats_collector.add_phase(name, seconds)
+
+    def get_stats(self):
+        # the stats of the last formatted table, or None if stats are disabled
+        if self._stats_collector is None:
+            return None
+        return self._stats_collector.to_dict()
+
+    def report_stats(self):
+        # passes the stats of the last table to the stats hook, and writes them if the stats modifiers are set
+        stats = self.get_stats()
+        if stats is None:
+            return
+        if self._stats_hook:
+            self._stats_hook(stats)
+        if self._stats or self._stats_file:
+            write_stats(stats, self._stats_file)
+
+    def is_streaming(self):
+        return self._stream
+
+    def format_stream(self, rows):
+        # sizes the columns according to the first rows and yields the table line by line, so
+        # rows are written as soon as they are formatted. a short input is formatted as a whole.
+        rows = iter(rows)
+        sample = list(itertools.islice(rows, self._stream_sample))
+        if len(sample) < self._stream_sample or not any(isinstance(item, dict) for item in sample):
+            yield self.format(sample + list(rows))
+            return
+        with self._formatting(keep_list_keys=False):
+            start = time.time()
+            compact, max_str_length = self._find_rows_layout(sample)
+            self.add_stats_phase('layout', time.time() - start)
+            self._set_layout_stats(compact, max_str_length)
+            keys = self._get_keys_of_a_list_of_dicts(sample)
+            all_data, widths, table_def = self._format_rows_table(sample, keys, compact, max_str_length)
+            num_objects = [len(sample)]
+
+            def _rows():
+                yield all_data[0], None
+                for item, row in itertools.izip(sample, all_data[1:]):
+                    yield row, self._get_row_colors(keys, item) if self._color else None
+                for item in rows:
+                    num_objects[0] += 1
+                    row = self._fit_row(item, keys, self._format_row(item, keys, compact, max_str_length), widths)
+                    yield row, self._get_row_colors(keys, item) if self._color else None
+
+            for line in self._iter_format_columns(table_def, 0, _rows()):
+                yield line
+            if self._count:
+                yield ''
+                yield 'object count: %s' % num_objects[0]
+
+    def aformat(self, data, filter_data=None):
+        # an awaitable of the table, formatted in a thread of the shared executor (see async_format) so the event
+        # loop is not blocked. data may be an async iterable of rows. cancelling the awaitable stops the formatting
+        from async_format import format_table
+        return format_table(self, data, filter_data)
+
+    def aformat_lines(self, data, filter_data=None):
+        # an async iterator of the lines of the table, which are passed on as soon as they are formatted if the
+        # table is streamed (see the stream modifier)
+        from async_format import TableLines
+        return TableLines(self, data, filter_data)
+
+    def _copy_for_job(self, cancelled):
+        # a copy that is formatted in another thread, so that concurrent jobs of the table don't share the state of
+        # the formatting. the color rules are not shared, since their cache is not thread-safe
+        table = copy.copy(self)
+        table._cancelled = cancelled
+        table._color_rules = None
+        return table
+
+    def _set_job_results(self, table):
+        for name in self._JOB_RESULTS:
+            setattr(self, name, getattr(table, name))
+
+    def _find_rows_layout(self, rows):
+        # the layout of a table of rows that is displayed without split-table and transpose
+        self._split_table = False
+        self._transpose = False
+        self._transposable = False
         try:
-            return self._adaptive_format(data, colors)
+            return self._find_layout(rows)
+        except FormatCancelled:
+            raise
         except:
-            # timeout, just use the quickest table
-            self._max_depth = 1
-            self._split_words = SplitWords.NEVER
-            self._split_table = False
-            self._transpose = False
-            self._timeout = None
-            return self._format(data, orig_colors, compact=False, max_str_length=None)
+            self._set_quickest_table()
+            self._degradation = Degradation.QUICKEST
+            return False, None
+        finally:
+            self._deadline = self._make_deadline()
+
+    def _format_rows_table(self, rows, keys, compact, max_str_length):
+        headers = [self._split_string(key, max_str_length) for key in keys]
+        data = [self._format_row(item, keys, compact, max_str_length) for item in rows]
+        all_data, widths = self._prepare_data_for_formatting(headers, data)
+        table_def = AdaptiveTableDef(widths, 0, compact, self._force_frames, self._horizontal_lines, 0, False, False, headers)
+        return all_data, widths, table_def
+
+    def _format_flat_rows(self, columns, headers, max_str_length):
+        # formats a list of dicts of scalars column by column. the widths are measured on the distinct cells of
+        # each column, and the rows are one line high unless some column has multi-line cells
+        formatted_columns = []
+        widths = []
+        heights = None
+        for flat_column, header in itertools.izip(columns, headers):
+            self._deadline.check_now()
+            column = self._format_flat_column(flat_column, max_str_length)
+            cells = set(column)
+            cells.add(unicode(header))
+            formatted_columns.append(column)
+            if any('\n' in cell for cell in cells):
+                widths.append(max(map(text_width, cells)))
+                line_breaks = [cell.count('\n') for cell in column]
+                heights = line_breaks if heights is None else map(max, heights, line_breaks)
+            else:
+                widths.append(max(map(len, cells)))
+        all_data = [TableRow([unicode(header) for header in headers])]
+        if heights is None:
+            all_data.extend(TableRow(list(cells), 1) for cells in itertools.izip(*formatted_columns))
+        else:
+            all_data.extend(TableRow(list(cells), 1 + line_breaks) for cells, line_breaks in itertools.izip(itertools.izip(*formatted_columns), heights))
+        return all_data, widths
+
+    def _format_rows(self, data, keys, compact, max_str_length):
+        # forking a process with other threads, e.g. the threads of aformat, may deadlock on their locks
+        if self._workers > 1 and threading.active_count() == 1 and self._count_nested_values(data) >= self._WORKERS_MIN_NESTED:
+            table = self._format_rows_in_workers(data, keys, compact, max_str_length)
+            if table is not None:
+                return table
+        return [self._format_row(item, keys, compact, max_str_length) for item in data]
+
+    def _count_nested_values(self, data):
+        return sum(1 for item in data if isinstance(item, dict) for value in item.itervalues() if isinstance(value, (dict, list, tuple)))
+
+    def _get_worker_state(self):
+        return {key: value for key, value in self.__dict__.iteritems() if key not in self._WORKER_STATE_EXCLUDED}
+
+    def _format_rows_in_workers(self, data, keys, compact, max_str_length):
+        # the rows are formatted in contiguous chunks, and the chunks are joined in their original order.
+        # returns None if the rows can't be formatted in worker processes.
+        import multiprocessing
+        chunk_size = -(-len(data) // (self._workers * 4))
+        chunks = [(data[index:index + chunk_size], keys, compact, max_str_length) for index in xrange(0, len(data), chunk_size)]
+        try:
+            pool = multiprocessing.Pool(self._workers, _init_worker, (self._get_worker_state(),))
+        except Exception:
+            return None
+        try:
+            results = pool.map(_format_rows_in_worker, chunks)
+        except LayoutTimeout:
+            raise
+        except Exception:
+            return None
+        finally:
+            pool.terminate()
+        return [row for result in results for row in result]
+
+    def _format_row(self, item, keys, compact, max_str_length):
+        if not isinstance(item, dict):
+            item = {'': item}
+        return [self._format_cell(item.get(key, ''), 1, compact, max_str_length) for key in keys]
+
+    def _fit_row(self, item, keys, raw_row, widths):
+        # cells of rows that were not measured are wrapped to the width of their column
+        if not isinstance(item, dict):
+            item = {'': item}
+        row = []
+        for key, cell, width in itertools.izip(keys, raw_row, widths):
+            lines = unicode(cell).split('\n')
+            if max(len(line) for line in lines) > width:
+                value = item.get(key, '')
+                if isinstance(value, (str, unicode)) and width:
+                    lines = self._split_string(value, width).split('\n')
+                step = width or 1
+                lines = [line[index:index + step] for line in lines for index in xrange(0, len(line) or 1, step)]
+            row.append('\n'.join(lines))
+        return TableRow(row)
 
     def _get_terminal_size(self):
-        try:
-            def ioctl_GWINSZ(fd):
-                try:
-                    return struct.unpack('hh', fcntl.ioctl(fd, termios.TIOCGWINSZ, '1234'))
-                except:
-                    pass
-            cr = ioctl_GWINSZ(0) or ioctl_GWINSZ(1) or ioctl_GWINSZ(2)
-            if cr is None:
-                cr = (1000, 1000)
-            return cr
-        except:
-            return 1000, 1000
+        return terminal.get_terminal_size() or (self._NON_TTY_HEIGHT, self._get_terminal_width())
+
+    def _get_terminal_width(self):
+        return terminal.get_terminal_width(self._non_tty_width)
+
+    def _update_width(self):
+        if self._auto_width:
+            self._width = self._get_terminal_width()
 
     def help(self):
         return ADAPTIVE_TABLE_HELP
+
+
+_worker_table = None
+
+
+def _init_worker(state):
+    # the table configuration is sent once to each worker process
+    global _worker_table
+    _worker_table = AdaptiveTable.__new__(AdaptiveTable)
+    _worker_table.__dict__.update(state)
+    _worker_table._color_dict = {}
+    _worker_table._color_rules = None
+    _worker_table._id_classifier = None
+    _worker_table._wrap_cache = WrapCache()
+    _worker_table._stats_hook = None
+    _worker_table._stats_collector = None
+    _worker_table._list_keys = None
+    _worker_table._cancelled = None
+    _worker_table._set_key_order()
+
+
+def _format_rows_in_worker(args):
+    data, keys, compact, max_str_length = args
+    return [_worker_table._format_row(item, keys, compact, max_str_length) for item in data]
@@ -1,3 +1,126 @@
+import itertools
+
+
+def line_width(widths, depth, compact, force_frames, indent):
+    # the exact length of every line of a table, without building its line format
+    width = sum(widths) + (1 if compact else 3) * len(widths) - 1
+    if (depth == 0 and not compact) or force_frames:
+        width += 2
+    return indent + width
+
+
+def pack_columns(widths, max_width, compact, indent, first_indent=0, header_width=None, balanced=False):
+    # splits the columns into consecutive (first, last) chunks, in one pass over the running width of each chunk.
+    # every chunk is as wide as possible without exceeding max_width (but has at least one column), or, if
+    # balanced, the same number of chunks is kept while giving them similar widths.
+    chunks = _pack_columns(widths, max_width, compact, indent, first_indent, header_width, None)
+    if not balanced or len(chunks) < 2:
+        return chunks
+    balanced_chunks = _pack_columns(widths, max_width, compact, indent, first_indent, header_width, len(chunks))
+    if len(balanced_chunks) == len(chunks):
+        return balanced_chunks
+    # otherwise make the widest chunk as narrow as possible
+    lower_limit, upper_limit = 0, max_width
+    while lower_limit < upper_limit:
+        limit = (lower_limit + upper_limit) // 2
+        if len(_pack_columns(widths, limit, compact, indent, first_indent, header_width, None)) > len(chunks):
+            lower_limit = limit + 1
+        else:
+            upper_limit = limit
+    return _pack_columns(widths, upper_limit, compact, indent, first_indent, header_width, None)
+
+
+def _pack_columns(widths, max_width, compact, indent, first_indent, header_width, num_chunks):
+    per_column = 1 if compact else 3
+    fixed_width = per_column - 2 + (0 if header_width is None else header_width + per_column)
+    remaining_width = sum(widths) + per_column * len(widths)
+    chunks = []
+    first_column = 0
+    while first_column < len(widths):
+        if num_chunks:
+            # aim at an even share of the columns that are left
+            target_width = remaining_width / float(max(num_chunks - len(chunks), 1))
+        chunk_width = fixed_width + (first_indent if first_column == 0 else indent)
+        columns_width = 0
+        last_column = first_column
+        while last_column < len(widths):
+            column_width = widths[last_column] + per_column
+            if last_column > first_column and (chunk_width + columns_width + column_width > max_width or
+                                               (num_chunks and columns_width + column_width / 2.0 > target_width)):
+                break
+            columns_width += column_width
+            last_column += 1
+        remaining_width -= columns_width
+        chunks.append((first_column, last_column))
+        first_column = last_column
+    return chunks
+
+
+def text_width(text):
+    if '\n' not in text:
+        return len(text)
+    return max(len(line) for line in text.split('\n'))
+
+
+class TableRow(object):
+    # a row of formatted cells, each kept as a single string until its lines are emitted
+    __slots__ = ('cells', 'height')
+
+    def __init__(self, cells, height=None):
+        self.cells = cells
+        self.height = height or 1 + max([0] + [cell.count('\n') for cell in cells])  # a row of an empty dict has no cells
+
+
+class TransposedView(object):
+    # the columns of a matrix as rows, read from the matrix when they are used instead of copying it.
+    # the rows of the matrix before first_row are left out
+    __slots__ = ('_matrix', '_first_row')
+
+    def __init__(self, matrix, first_row=0):
+        self._matrix = matrix
+        self._first_row = first_row
+
+    def __len__(self):
+        return len(self._matrix[self._first_row])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return _TransposedRow(self._matrix, self._first_row, index)
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield _TransposedRow(self._matrix, self._first_row, index)
+
+
+class _TransposedRow(object):
+    __slots__ = ('_matrix', '_first_row', '_column')
+
+    def __init__(self, matrix, first_row, column):
+        self._matrix = matrix
+        self._first_row = first_row
+        self._column = column
+
+    def __len__(self):
+        return len(self._matrix) - self._first_row
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._matrix[self._first_row + row_index][self._column] for row_index in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._matrix[self._first_row + index][self._column]
+
+    def __iter__(self):
+        column = self._column
+        for row in itertools.islice(self._matrix, self._first_row, None):
+            yield row[column]
+
+
 class AdaptiveTableDef(object):
     def __init__(self, widths, depth, compact, force_frames, horizontal_lines, indent, transpose, vertical, headers):
         self._widths = widths
@@ -56,9 +179,31 @@ class AdaptiveTableDef(object):
             return self._header_separator
         return self._vertical_separator if self._vertical and row_index > 0 else self._line_separator
 
+    def render_row(self, row, row_colors=None):
+        # pads and colors the cells of a row once and returns all its lines
+        num_columns = len(self._widths)
+        cells = row.cells
+        if len(cells) < num_columns:
+            cells = cells + [''] * (num_columns - len(cells))
+        if row.height == 1:
+            if row_colors and any(row_colors):
+                cells = [self._add_color(cell, color, width) if color else cell
+                         for cell, color, width in zip(cells, row_colors, self._widths)] + cells[len(row_colors):]
+            return [self.line_format % tuple(cells)]
+        columns = []
+        for column_index, cell in enumerate(cells):
+            lines = cell.split('\n')
+            if row_colors and column_index < len(row_colors) and row_colors[column_index]:
+                lines = [self._add_color(line, row_colors[column_index], self._widths[column_index]) for line in lines]
+            columns.append(lines + [''] * (row.height - len(lines)))
+        line_format = self.line_format
+        return [line_format % line for line in zip(*columns)]
+
+    def _add_color(self, string, color_prefix, width):
+        # the escape codes do not take space on the terminal, so the padding is added after them
+        if not color_prefix:
+            return string
+        return ''.join((color_prefix, string, '\033[0m', ' ' * (width - len(string))))
+
     def get_end_separator(self):
         return self._line_separator
-
-    def total_width(self):
-        per_column = 1 if self._compact else 3
-        return self._indent + sum(self._widths) + per_column * len(self._widths) + per_column - 2
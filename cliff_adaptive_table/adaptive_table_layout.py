@@ -0,0 +1,259 @@
+import json
+import bisect
+import itertools
+
+from adaptive_table_def import line_width, pack_columns, text_width
+
+
+class _SubTable(object):
+    # a nested table, measured for every string length that is tried but never rendered. its width doesn't change
+    # from the string length at which all its strings fit in one line, so longer string lengths share that width
+    __slots__ = ('_layout', '_depth', '_rows', '_num_columns', '_widths', '_one_line_limit')
+
+    def __init__(self, layout, depth, headers, rows):
+        self._layout = layout
+        self._depth = depth
+        self._rows = [headers] + rows if headers else rows
+        self._num_columns = max(len(row) for row in rows)
+        self._widths = {}
+        self._one_line_limit = None
+
+    def column_widths(self, max_str_length, compact):
+        cell_width = self._layout.cell_width
+        widths = [0] * self._num_columns
+        for row in self._rows:
+            for index, cell in enumerate(row):
+                width = cell_width(cell, max_str_length, compact)
+                if width > widths[index]:
+                    widths[index] = width
+        return widths
+
+    def one_line_limit(self):
+        # measured when the first string length is tried, since a table that fits unsplit doesn't need it
+        if self._one_line_limit is None:
+            self._layout.check_timeout()
+            cell_limit = self._layout.cell_limit
+            self._one_line_limit = max(cell_limit(cell) for row in self._rows for cell in row)
+        return self._one_line_limit
+
+    def width(self, max_str_length, compact):
+        if max_str_length is not None:
+            max_str_length = min(max_str_length, self.one_line_limit())
+        key = (max_str_length, compact)
+        if key not in self._widths:
+            self._layout.check_timeout()
+            widths = self.column_widths(max_str_length, compact)
+            self._widths[key] = line_width(widths, self._depth, compact, self._layout.force_frames, 0)
+        return self._widths[key]
+
+
+class _TopTable(_SubTable):
+    def __init__(self, layout, headers, rows, transpose, split_table):
+        super(_TopTable, self).__init__(layout, 0, None if transpose else headers, rows)
+        self._headers = headers
+        self._transpose = transpose
+        self._split_table = split_table and bool(headers)
+
+    def width(self, max_str_length, compact):
+        self._layout.check_timeout()
+        if self._transpose:
+            cell_width = self._layout.cell_width
+            header_width = max(cell_width(header, max_str_length, compact) for header in self._headers)
+            widths = [max(cell_width(cell, max_str_length, compact) for cell in row) for row in self._rows]
+        else:
+            header_width = None
+            widths = self.column_widths(max_str_length, compact)
+        if self._split_table:
+            widths = self._first_chunk(widths, header_width, compact)
+        if header_width is not None:
+            widths = [header_width] + widths
+        return line_width(widths, 0, compact, self._layout.force_frames, 0)
+
+    def _first_chunk(self, widths, header_width, compact):
+        first_column, last_column = pack_columns(widths, self._layout.table_width, compact, 0 if self._transpose else 2,
+                                                 header_width=header_width, balanced=self._layout.split_table_balanced)[0]
+        return widths[first_column:last_column]
+
+
+class _Column(object):
+    # the distinct strings of a column of scalars, sorted by the string length from which each one is displayed
+    # in one line. the width of the column for a string length is the widest of the strings displayed in one
+    # line, found by a binary search, or of the longer strings, which are wrapped until one fills the string length
+    def __init__(self, layout, header, column):
+        self._layout = layout
+        layout.check_timeout_now()
+        if column.all_strings:
+            strings = set(column.values)
+            cells = set()
+        elif layout.splits_scalars:
+            strings = set(layout.get_flat_cells(column))
+            cells = set()
+        elif column.has_strings:
+            strings = set(value for value in column.values if isinstance(value, basestring))
+            cells = set(cell for value, cell in itertools.izip(column.values, layout.get_flat_cells(column)) if not isinstance(value, basestring))
+        else:
+            strings = set()
+            cells = set(layout.get_flat_cells(column))
+        strings.add(header)
+        self._fixed_width = max([0] + map(text_width, cells))
+        self._unsplit_width = max([self._fixed_width] + map(text_width, map(unicode, strings)))
+        self._all_strings = strings
+        self._strings = None
+
+    def _measure(self):
+        one_line_limit = self._layout.one_line_limit
+        measures = sorted((one_line_limit(string) + (string,) for string in self._all_strings), key=lambda measure: measure[0])
+        self._limits = [limit for limit, _, _ in measures]
+        self._strings = [string for _, _, string in measures]
+        self._widths = [self._fixed_width]
+        for _, width, _ in measures:
+            self._widths.append(max(self._widths[-1], width))
+
+    def width(self, max_str_length):
+        if max_str_length is None:
+            return self._unsplit_width
+        if self._strings is None:
+            self._measure()
+        num_one_line = bisect.bisect_right(self._limits, max_str_length)
+        width = self._widths[num_one_line]
+        bounded = self._layout.wraps_to_limit
+        for index in xrange(len(self._strings) - 1, num_one_line - 1, -1):
+            if bounded and width >= max_str_length:
+                break
+            width = max(width, self._layout.string_width(self._strings[index], max_str_length))
+        return width
+
+
+class _FlatTable(_TopTable):
+    # a table of rows with scalar values only, measured column by column
+    def __init__(self, layout, headers, columns, split_table):
+        self._layout = layout
+        self._transpose = False
+        self._split_table = split_table
+        self._columns = [_Column(layout, header, column) for header, column in zip(headers, columns)]
+
+    def column_widths(self, max_str_length, compact):
+        return [column.width(max_str_length) for column in self._columns]
+
+
+class _RenderedTable(object):
+    def __init__(self, table, data):
+        self._table = table
+        self._data = data
+
+    def width(self, max_str_length, compact):
+        rendered = self._table._format(self._data, None, compact, max_str_length)
+        first_line = rendered.find('\n')
+        return len(rendered) if first_line < 0 else first_line
+
+
+class LayoutPlan(object):
+    # the layout chosen for a table. it is reused for the next tables with the same shape, as long as they fit
+    __slots__ = ('shape', 'compact', 'max_str_length')
+
+    def __init__(self, shape, compact, max_str_length):
+        self.shape = shape
+        self.compact = compact
+        self.max_str_length = max_str_length
+
+
+class AdaptiveTableLayout(object):
+    def __init__(self, table, data):
+        self._table = table
+        self._string_widths = {}
+        self._string_limits = {}
+        self.force_frames = table._force_frames
+        self.table_width = table._width
+        self.split_table_balanced = table._split_table_balanced
+        self.check_timeout = table._deadline.check
+        self.check_timeout_now = table._deadline.check_now
+        self.one_line_limit = table._one_line_limit
+        self.get_flat_cells = table._get_flat_cells
+        self.splits_scalars = table._splits_scalars()
+        self.wraps_to_limit = table._wraps_to_limit()
+        self._root = self._build_root(data)
+
+    def width(self, max_str_length, compact):
+        return self._root.width(max_str_length, compact)
+
+    def cell_width(self, cell, max_str_length, compact):
+        if isinstance(cell, int):
+            return cell
+        if isinstance(cell, basestring):
+            return self.string_width(cell, max_str_length)
+        return cell.width(max_str_length, compact)
+
+    def string_width(self, string, max_str_length):
+        key = (string, max_str_length)
+        width = self._string_widths.get(key)
+        if width is None:
+            self.check_timeout()
+            width = self._text_width(self._table._split_string(string, max_str_length))
+            self._string_widths[key] = width
+        return width
+
+    def cell_limit(self, cell):
+        # the shortest string length with which the cell is as wide as with any longer one
+        if isinstance(cell, int):
+            return 0
+        if isinstance(cell, basestring):
+            limit = self._string_limits.get(cell)
+            if limit is None:
+                limit = self._string_limits[cell] = self.one_line_limit(cell)[0]
+            return limit
+        return cell.one_line_limit()
+
+    def _text_width(self, text):
+        return text_width(unicode(text))
+
+    def _key(self, key):
+        return key if isinstance(key, basestring) else unicode(key)
+
+    def _build_root(self, data):
+        table = self._table
+        if isinstance(data, dict) and data:
+            keys = table._key_order.sorted_keys(data)
+            rows = [[self._text_width(key), self._build_cell(data[key], 1)] for key in keys]
+            return _TopTable(self, None, rows, False, False)
+        if isinstance(data, (list, tuple)) and data:
+            transpose = table._transpose and table._transposable
+            keys = table._get_keys_of_a_list_of_dicts(data)
+            if any(isinstance(item, dict) for item in data) and keys:
+                columns = None if transpose else table._get_flat_columns(data, keys)
+                if columns is not None:
+                    return _FlatTable(self, [self._key(key) for key in keys], columns, table._split_table)
+                rows = [self._build_row(item, keys, 1) for item in data]
+                return _TopTable(self, [self._key(key) for key in keys], rows, transpose, table._split_table)
+            if not transpose:
+                return _TopTable(self, None, [[self._build_cell(value, 1)] for value in data], False, False)
+        return _RenderedTable(table, data)
+
+    def _build_row(self, item, keys, depth):
+        if not isinstance(item, dict):
+            item = {'': item}
+        return [self._build_cell(item.get(key, ''), depth) for key in keys]
+
+    def _build_cell(self, data, depth):
+        table = self._table
+        self.check_timeout()
+        if isinstance(data, (str, unicode)):
+            return data
+        if table._max_depth is not None and depth >= table._max_depth:
+            return json.dumps(data, sort_keys=True)
+        if isinstance(data, dict):
+            if not data:
+                return self._text_width({})
+            keys = table._key_order.sorted_keys(data)
+            return _SubTable(self, depth, None, [[self._key(key), self._build_cell(data[key], depth + 1)] for key in keys])
+        if isinstance(data, (list, tuple)):
+            if not data:
+                return self._text_width([])
+            keys = table._get_keys_of_a_list_of_dicts(data)
+            if any(isinstance(item, dict) for item in data):
+                if not keys:
+                    return 0
+                return _SubTable(self, depth, [self._key(key) for key in keys], [self._build_row(item, keys, depth + 1) for item in data])
+            return _SubTable(self, depth, None, [[self._build_cell(value, depth + 1)] for value in data])
+        if data is True or data is False or data is None:
+            return self._text_width(table._format_cell(data, depth, False, None))
+        return self._text_width(data)
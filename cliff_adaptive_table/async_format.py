@@ -0,0 +1,298 @@
+import time
+import threading
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    import trollius as asyncio
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+try:
+    import builtins
+except ImportError:  # Python 2
+    import __builtin__ as builtins
+from concurrent.futures import ThreadPoolExecutor
+
+from deadline import FormatCancelled
+
+
+# formats tables in threads for asyncio event loops. the threads hold the GIL while they format, but they release
+# it often enough for the event loop and the other threads to run. a job is cancelled by an event that is checked
+# with the deadline of the table, so a cancelled job stops within a few cells
+
+if hasattr(builtins, 'StopAsyncIteration'):
+    StopAsyncIteration = builtins.StopAsyncIteration
+else:
+    class StopAsyncIteration(Exception):
+        pass
+
+_MAX_WORKERS = 16  # the threads of streamed tables mostly wait for their rows or for their readers
+_MAX_PENDING = 1000  # rows or lines that are read ahead
+_POLL_INTERVAL = 0.05  # seconds between checks of the cancellation while a thread waits for rows or for the reader
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # the executor shared by all the tables of the process
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(_MAX_WORKERS)
+        return _executor
+
+
+def set_executor(executor):
+    # replaces the shared executor, e.g. with one with more threads for more concurrent tables
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+
+class _Failure(object):
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+_END = object()
+
+
+class _AsyncRows(object):
+    # the rows of an async iterable, read ahead on the event loop and iterated by the thread of a job
+    def __init__(self, rows, loop, cancelled):
+        self._rows = rows.__aiter__()
+        self._loop = loop
+        self._cancelled = cancelled
+        self._queue = queue.Queue(_MAX_PENDING)
+        self._reading = False
+
+    def read(self):
+        # reads rows until the queue is full, when the thread resumes the reading
+        if self._reading or self._cancelled.is_set() or self._queue.full():
+            return
+        self._reading = True
+        asyncio.ensure_future(self._rows.__anext__(), loop=self._loop).add_done_callback(self._on_row)
+
+    def _on_row(self, future):
+        self._reading = False
+        if future.cancelled():
+            self._queue.put_nowait(_Failure(FormatCancelled()))
+        elif isinstance(future.exception(), StopAsyncIteration):
+            self._queue.put_nowait(_END)
+        elif future.exception() is not None:
+            self._queue.put_nowait(_Failure(future.exception()))
+        else:
+            self._queue.put_nowait(future.result())
+            self.read()
+
+    def __iter__(self):
+        while True:
+            full = self._queue.full()
+            try:
+                item = self._queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if self._cancelled.is_set():
+                    raise FormatCancelled()
+                self._resume_reading()
+                continue
+            if full:
+                self._resume_reading()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+
+    def _resume_reading(self):
+        try:
+            self._loop.call_soon_threadsafe(self.read)
+        except RuntimeError:  # the event loop is closed, so no more rows are read
+            self._cancelled.set()
+
+
+class _Job(object):
+    # a table formatted in a thread of the executor. the table is copied, and its results are copied back when the
+    # job is done
+    def __init__(self, table, data, filter_data, loop):
+        self.cancelled = threading.Event()
+        self.loop = loop
+        self._table = table
+        self._job_table = table._copy_for_job(self.cancelled)
+        self._filter_data = filter_data
+        self._rows = None
+        self._data = data
+        if hasattr(data, '__aiter__'):
+            self._rows = _AsyncRows(data, loop, self.cancelled)
+            self._rows.read()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def set_results(self):
+        self._table._set_job_results(self._job_table)
+
+    def format(self):
+        return self._job_table.format(self._get_data())
+
+    def iter_lines(self):
+        table = self._job_table
+        if table.is_streaming() and not isinstance(self._data, dict):
+            rows = self._data if self._rows is None else self._rows
+            if self._filter_data is not None:
+                rows = self._filter_data.filter_rows(rows)
+            return table.format_stream(rows)
+        return iter(table.format(self._get_data()).split('\n'))
+
+    def _get_data(self):
+        data = self._data if self._rows is None else list(self._rows)
+        if self._filter_data is None:
+            return data
+        start = time.time()
+        data = self._filter_data.filter_data(data)
+        self._job_table.add_stats_phase('filter', time.time() - start)
+        return data
+
+
+def format_table(table, data, filter_data=None):
+    # a future of the formatted table. cancelling it cancels the job
+    loop = asyncio.get_event_loop()
+    job = _Job(table, data, filter_data, loop)
+    future = loop.run_in_executor(get_executor(), job.format)
+
+    def _done(future):
+        if future.cancelled():
+            job.cancel()
+        else:
+            job.set_results()
+    future.add_done_callback(_done)
+    return future
+
+
+class TableLines(object):
+    # an async iterator of the lines of a table formatted in a thread of the executor. at most _MAX_PENDING lines
+    # wait for the reader. closing the iterator, or cancelling a task that waits for a line, cancels the job, e.g.
+    #     async with table.aformat_lines(rows) as lines:
+    #         async for line in lines:
+    #             ...
+    def __init__(self, table, data, filter_data=None):
+        loop = asyncio.get_event_loop()
+        self._job = _Job(table, data, filter_data, loop)
+        self._lines = queue.Queue(_MAX_PENDING)
+        self._end = None
+        self._waiter = None
+        self._closed = False
+        self._producer = loop.run_in_executor(get_executor(), self._produce)
+
+    def _produce(self):
+        # in the thread of the job. the end is set after the last line is queued
+        try:
+            for line in self._job.iter_lines():
+                self._put(line)
+            end = _END
+        except FormatCancelled:
+            return
+        except Exception as error:
+            end = _Failure(error)
+        self._end = end
+        self._call_reader(self._wake)
+
+    def _put(self, line):
+        while True:
+            if self._job.cancelled.is_set():
+                raise FormatCancelled()
+            try:
+                self._lines.put(line, timeout=_POLL_INTERVAL)
+                break
+            except queue.Full:
+                pass
+        if self._waiter is not None:
+            self._call_reader(self._wake)
+
+    def _call_reader(self, callback):
+        # from the thread of the job. a cancelled job doesn't call back, since its reader is gone and the event loop
+        # may be closed
+        if self._job.cancelled.is_set():
+            return
+        try:
+            self._job.loop.call_soon_threadsafe(callback)
+        except RuntimeError:  # the event loop is closed
+            self._job.cancel()
+
+    def _next(self):
+        # the next line, _END or a _Failure, or None if the job has not formatted it yet. the end is read before
+        # the queue, since all the lines are queued by the time it is set
+        end = self._end
+        try:
+            return self._lines.get_nowait()
+        except queue.Empty:
+            return end
+
+    def _wake(self):
+        waiter = self._waiter
+        if waiter is None or waiter.done():
+            return
+        item = self._next()
+        if item is not None:
+            self._waiter = None
+            self._resolve(waiter, item)
+
+    def _resolve(self, future, item):
+        if item is _END:
+            self._job.set_results()
+            future.set_exception(StopAsyncIteration())
+        elif isinstance(item, _Failure):
+            future.set_exception(item.error)
+        else:
+            future.set_result(item)
+
+    def _on_waiter_done(self, future):
+        if future.cancelled():
+            self._waiter = None
+            self.close()
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = asyncio.Future(loop=self._job.loop)
+        if self._closed:
+            future.set_exception(StopAsyncIteration())
+            return future
+        self._waiter = future
+        item = self._next()
+        if item is not None:
+            self._waiter = None
+            self._resolve(future, item)
+        else:
+            future.add_done_callback(self._on_waiter_done)
+        return future
+
+    def close(self):
+        # stops the job. the lines that were not read are dropped, and a reader waiting for a line gets the end
+        self._closed = True
+        self._job.cancel()
+        waiter = self._waiter
+        self._waiter = None
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(StopAsyncIteration())
+
+    def aclose(self):
+        self.close()
+        return self._done()
+
+    def __aenter__(self):
+        return self._done(self)
+
+    def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return self._done()
+
+    def _done(self, result=None):
+        future = asyncio.Future(loop=self._job.loop)
+        future.set_result(result)
+        return future
@@ -1,7 +1,7 @@
-from cliff.formatters.base import ListFormatter, SingleFormatter
+import sys
+import time
 
-from adaptive_table import AdaptiveTable
-from filter_data import FilterData
+from cliff.formatters.base import ListFormatter, SingleFormatter
 
 
 class AdaptiveTableFormatter(ListFormatter, SingleFormatter):
@@ -10,16 +10,27 @@ class AdaptiveTableFormatter(ListFormatter, SingleFormatter):
     # {'status': {'success': '\033[32;1m',
     #             'failure': '\033[31;1m'}}
     # will color 'success' values in 'status' fields in bright green
-    # and 'failure' values in bright red
+    # and 'failure' values in bright red.  instead of a dictionary, a
+    # column can have a list of (rule, color) pairs, whose rules are
+    # values, compiled regular expressions or color_rules.Range objects:
+    # {'cpu': [(Range(minimum=90), '\033[31;1m')]}
     OUTPUT_COLUMN_COLORS = {}
+    # STATS_HOOK is a function that is called with the stats of every
+    # formatted table (see the stats modifier), e.g. to send them to a
+    # dashboard.  set it with staticmethod(function).  stats are
+    # collected only if it is set or the stats modifiers are used
+    STATS_HOOK = None
     MODIFIER_HELP = 'Modifiers - see adaptive_table.py and filter_data.py for documentation'
 
     def add_argument_group(self, parser):
         group = parser.add_argument_group('adaptive table formatter')
         group.add_argument('-m', '--modifiers', metavar='NAME=VALUE', nargs='*', action='append', help=self.MODIFIER_HELP)
 
-    def _emit(self, data, stdout, parsed_args):
-        adaptive_table = AdaptiveTable(color_dict=self.OUTPUT_COLUMN_COLORS)
+    def _create_formatters(self, stdout, parsed_args):
+        # imported here, since this module is loaded by every command of the CLI, even with other formatters
+        from adaptive_table import AdaptiveTable
+        from filter_data import FilterData
+        adaptive_table = AdaptiveTable(color_dict=self.OUTPUT_COLUMN_COLORS, stats_hook=self.STATS_HOOK)
         filter_data = FilterData()
         modifiers = []
         for modifier_list in (parsed_args.modifiers or []):
@@ -29,14 +40,84 @@ class AdaptiveTableFormatter(ListFormatter, SingleFormatter):
         if invalid_modifiers:
             stdout.write('invalid modifiers: %s\n' % (' '.join(invalid_modifiers)))
             stdout.write('valid modifiers: %s\n' % (' '.join(adaptive_table.get_modifier_names() + filter_data.get_modifier_names())))
+        return adaptive_table, filter_data
+
+    def _emit(self, data, stdout, adaptive_table, filter_data):
+        start = time.time()
         data = filter_data.filter_data(data)
-        stdout.write(adaptive_table.format(data))
+        filtered = time.time()
+        output = adaptive_table.format(data)
+        formatted = time.time()
+        stdout.write(output)
         stdout.write('\n')
+        adaptive_table.add_stats_phase('filter', filtered - start)
+        adaptive_table.add_stats_phase('write', time.time() - formatted)
+        adaptive_table.report_stats()
+
+    def _emit_stream(self, rows, stdout, adaptive_table, filter_data):
+        # the rows are filtered, formatted and written together, so only the whole stream is timed
+        start = time.time()
+        for line in adaptive_table.format_stream(filter_data.filter_rows(rows)):
+            stdout.write(line)
+            stdout.write('\n')
+        adaptive_table.add_stats_phase('stream', time.time() - start)
+        adaptive_table.report_stats()
 
     def emit_list(self, column_names, data, stdout, parsed_args):
-        combined = [dict(zip(column_names, row)) for row in data]
-        self._emit(combined, stdout, parsed_args)
+        adaptive_table, filter_data = self._create_formatters(stdout, parsed_args)
+        combined = (dict(zip(column_names, row)) for row in data)
+        if adaptive_table.is_streaming():
+            self._emit_stream(combined, stdout, adaptive_table, filter_data)
+        else:
+            self._emit(list(combined), stdout, adaptive_table, filter_data)
 
     def emit_one(self, column_names, data, stdout, parsed_args):
+        adaptive_table, filter_data = self._create_formatters(stdout, parsed_args)
         combined = dict(zip(column_names, list(data)))
-        self._emit(combined, stdout, parsed_args)
+        self._emit(combined, stdout, adaptive_table, filter_data)
+
+
+class _RecordFormatter(ListFormatter, SingleFormatter):
+    # filters the rows like the adaptive table formatter, and writes them as records without laying out a table
+    FORMAT = None
+    MODIFIER_HELP = 'Modifiers - see record_writer.py and filter_data.py for documentation'
+
+    def add_argument_group(self, parser):
+        group = parser.add_argument_group('%s formatter' % self.FORMAT)
+        group.add_argument('-m', '--modifiers', metavar='NAME=VALUE', nargs='*', action='append', help=self.MODIFIER_HELP)
+
+    def _create_writers(self, parsed_args):
+        from record_writer import RecordWriter
+        from filter_data import FilterData
+        record_writer = RecordWriter(self.FORMAT)
+        filter_data = FilterData()
+        modifiers = []
+        for modifier_list in (parsed_args.modifiers or []):
+            modifiers.extend(modifier_list)
+        invalid_modifiers = filter_data.parse_modifiers(record_writer.parse_modifiers(modifiers))
+        if invalid_modifiers:
+            # stderr, so the records can still be parsed
+            sys.stderr.write('invalid modifiers: %s\n' % (' '.join(invalid_modifiers)))
+            sys.stderr.write('valid modifiers: %s\n' % (' '.join(record_writer.get_modifier_names() + filter_data.get_modifier_names())))
+        return record_writer, filter_data
+
+    def emit_list(self, column_names, data, stdout, parsed_args):
+        record_writer, filter_data = self._create_writers(parsed_args)
+        combined = (dict(zip(column_names, row)) for row in data)
+        record_writer.write_rows(filter_data.filter_rows(combined), stdout)
+
+    def emit_one(self, column_names, data, stdout, parsed_args):
+        record_writer, filter_data = self._create_writers(parsed_args)
+        record_writer.write_one(filter_data.filter_data(dict(zip(column_names, list(data)))), stdout)
+
+
+class NdjsonFormatter(_RecordFormatter):
+    FORMAT = 'ndjson'
+
+
+class CsvFormatter(_RecordFormatter):
+    FORMAT = 'csv'
+
+
+class TsvFormatter(_RecordFormatter):
+    FORMAT = 'tsv'
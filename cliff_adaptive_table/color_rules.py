@@ -0,0 +1,86 @@
+import re
+import numbers
+
+
+class Range(object):
+    # a rule that matches the numbers from minimum to maximum, inclusive. a limit that is None is not checked
+    def __init__(self, minimum=None, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def matches(self, value):
+        return ((self.minimum is None or value >= self.minimum) and
+                (self.maximum is None or value <= self.maximum))
+
+
+class _ColumnRules(object):
+    # the colors of the exact string values of a column, and the regex and range rules that are tried in order
+    # on the other values. the color of every value matched against the rules is kept, so each distinct value
+    # is matched once
+    _CACHE_SIZE = 10000
+
+    def __init__(self, rules):
+        self._values = {}
+        self._string_rules = []
+        self._number_rules = []
+        for rule, color in (rules.iteritems() if isinstance(rules, dict) else rules):
+            if isinstance(rule, Range):
+                self._number_rules.append((rule.matches, color))
+            elif hasattr(rule, 'pattern'):
+                self._string_rules.append((re.compile('(?:%s)\\Z' % rule.pattern, rule.flags).match, color))
+            elif isinstance(rule, basestring):
+                self._values.setdefault(rule, color)
+        self._cache = {}
+        # only exact values are looked up in columns without other rules
+        self.lookup = self.get if self._string_rules or self._number_rules else self._values.get
+
+    def get(self, value):
+        if isinstance(value, basestring):
+            color = self._values.get(value)
+            if color is not None or not self._string_rules:
+                return color
+            rules = self._string_rules
+        elif isinstance(value, numbers.Real) and not isinstance(value, bool) and self._number_rules:
+            rules = self._number_rules
+        else:
+            return None
+        try:
+            return self._cache[value]
+        except KeyError:
+            pass
+        color = next((color for matches, color in rules if matches(value)), None)
+        if len(self._cache) < self._CACHE_SIZE:
+            self._cache[value] = color
+        return color
+
+
+class ColorRules(object):
+    # the color dict maps column names to either a dict of exact string values and their colors, or a list of
+    # (rule, color) pairs whose rules are exact string values, compiled regular expressions that match entire
+    # string values, or Range objects that match numbers. exact values are looked up before the other rules.
+    # only the columns of the color dict are looked at.
+    def __init__(self, color_dict):
+        self._columns = {column: _ColumnRules(rules) for column, rules in color_dict.iteritems()
+                         if isinstance(column, basestring)}
+        self._keys = None
+        self._colorable = []
+
+    def colorable(self, keys):
+        # the (index, key, lookup) of the colored columns. the rows of a table share their keys list, so they are
+        # looked up again only for a new list
+        if keys is not self._keys:
+            self._colorable = [(index, key, self._columns[key].lookup) for index, key in enumerate(keys)
+                               if isinstance(key, basestring) and key in self._columns]
+            self._keys = keys
+        return self._colorable
+
+    def row_colors(self, keys, item):
+        colors = [None] * len(keys)
+        for index, key, lookup in self.colorable(keys):
+            value = item.get(key)
+            if value is not None:
+                try:
+                    colors[index] = lookup(value)
+                except TypeError:
+                    pass  # unhashable values have no color
+        return colors
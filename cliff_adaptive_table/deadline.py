@@ -0,0 +1,36 @@
+import time
+
+
+class LayoutTimeout(RuntimeError):
+    pass
+
+
+class FormatCancelled(RuntimeError):
+    pass
+
+
+class Deadline(object):
+    # the clock and the cancellation are read only once every _CHECK_INTERVAL checks, since the checks are made
+    # for every cell. cancelled is an event that is set from another thread to stop the formatting
+    _CHECK_INTERVAL = 256
+
+    def __init__(self, ttl=None, cancelled=None):
+        self._time = None if ttl is None else time.time() + ttl
+        self._cancelled = cancelled
+        self._count = 0
+
+    def check(self):
+        if self._time is None and self._cancelled is None:
+            return
+        self._count += 1
+        if self._count >= self._CHECK_INTERVAL:
+            self._count = 0
+            if self._cancelled is not None and self._cancelled.is_set():
+                raise FormatCancelled()
+            if self._time is not None and time.time() > self._time:
+                raise LayoutTimeout()
+
+    def check_now(self):
+        # for the checks that are made rarely, e.g. once for every column of a long table
+        self._count = self._CHECK_INTERVAL
+        self.check()
@@ -1,8 +1,14 @@
+import re
+import heapq
+import numbers
+import itertools
+import collections
+
 import modifier
 
 
 FILTER_DATA_HELP = {
-    'description': 'These modifiers are processed in the following order: grep*, head, tail and finally columns and columns-v.',
+    'description': 'These modifiers are processed in the following order: grep*, columns and columns-v, head, tail and finally sort and top.',
     'modifiers':
     [
         {
@@ -65,19 +71,114 @@ FILTER_DATA_HELP = {
             ]
         },
         {
-            'modifier': 'sort=[<order>:]<column name>',
-            'description': 'Sorts rows according to the values in a specific column. Note: column name must be exact. Order, if given, is either \'a\' or \'A\' for ascending, or \'d\' or \'D\' for descending.',
+            'modifier': 'sort=[<order>:]<column name>[,[<order>:]<column name>...]',
+            'description': 'Sorts rows according to the values in specific columns. Rows with equal values in the first column are sorted by the second column, and so on. Empty values come first, then numbers, and then strings. Note: column name must be exact. Order, if given, is either \'a\' or \'A\' for ascending, or \'d\' or \'D\' for descending.',
             'examples':
             [
                 'sort=score - Sorts columns according to the values in column \'score\' in ascending order',
                 'sort=A:name - Sorts columns according to the values in column \'name\' in ascending order',
                 'sort=d:age - Sorts columns according to the values in column \'age\' in descending order',
+                'sort=d:cpu,a:name - Sorts columns according to the values in column \'cpu\' in descending order, and rows with the same \'cpu\' according to \'name\'',
+            ]
+        },
+        {
+            'modifier': 'top=<n>',
+            'description': 'Displays only the first n rows according to the sort modifier, without sorting all the rows. Like sort, it is processed after head and tail. Without sort, it is the same as head.',
+            'examples':
+            [
+                'sort=d:cpu top=20 - Displays the 20 rows with the highest values in column \'cpu\'',
             ]
         },
     ],
 }
 
 
+_REGEX_METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+_BACK_REFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def _get_search(pattern):
+    # case-sensitive patterns without metacharacters are searched as plain substrings
+    if not pattern.flags & re.IGNORECASE and not _REGEX_METACHARACTERS.intersection(pattern.pattern):
+        literal = pattern.pattern
+        return lambda text: literal in text
+    return pattern.search
+
+
+def _get_combined_search(patterns):
+    # one alternation of all the patterns, unless they can't be combined
+    if len(patterns) == 1:
+        return patterns[0].search
+    if len(set(pattern.flags for pattern in patterns)) == 1 and not any(_BACK_REFERENCE.search(pattern.pattern) for pattern in patterns):
+        try:
+            return re.compile('|'.join('(?:%s)' % pattern.pattern for pattern in patterns), patterns[0].flags).search
+        except re.error:
+            pass
+    return lambda text: any(pattern.search(text) for pattern in patterns)
+
+
+def _iter_texts(data):
+    if isinstance(data, dict):
+        values = data.itervalues()
+    elif isinstance(data, (list, tuple)):
+        values = data
+    else:
+        yield str(data)
+        return
+    for value in values:
+        if isinstance(value, (dict, list, tuple)):
+            for text in _iter_texts(value):
+                yield text
+        else:
+            yield str(value)
+
+
+def _typed_key(value):
+    # orders None first, then numbers by value, strings, and then other values grouped by their type
+    if value is None:
+        return (0,)
+    if isinstance(value, numbers.Number):
+        return (1, value)
+    if isinstance(value, basestring):
+        return (2, value)
+    return (3, type(value).__name__, value)
+
+
+class _Descending(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+class _RowTexts(object):
+    # the leaf values of a row as strings, converted lazily and kept for the following patterns
+    __slots__ = ('_texts', '_pending')
+
+    def __init__(self, row):
+        self._texts = []
+        self._pending = _iter_texts(row)
+
+    def search(self, search):
+        for text in self._texts:
+            if search(text):
+                return True
+        for text in self._pending:
+            self._texts.append(text)
+            if search(text):
+                return True
+        return False
+
+
 class FilterData(object):
     MODIFIERS = {'grep': modifier.append_regex,
                  'grep-v': modifier.append_regex,
@@ -90,67 +191,116 @@ class FilterData(object):
                  'columns-v': modifier.append_case_insensitive_regex,
                  'head': modifier.to_int,
                  'tail': modifier.to_int,
-                 'sort': modifier.sort}
+                 'sort': modifier.sort,
+                 'top': modifier.to_int}
 
-    def _filter_data(self, data, greps, reverse_greps):
-        def _matches(data, pattern):
-            if isinstance(data, dict):
-                return any(_matches(value, pattern) for value in data.itervalues())
-            if isinstance(data, (list, tuple)):
-                return any(_matches(value, pattern) for value in data)
-            return pattern.search(str(data))
+    def _get_row_filter(self):
+        # returns a function that tells whether a row passes the grep* modifiers. the leaf values of the row are
+        # converted to strings at most once, and only as far as needed to decide
+        greps, reverse_greps = self._get_greps()
+        if not greps and not reverse_greps:
+            return None
+        greps = [_get_search(pattern) for pattern in greps]
+        reverse_greps = [_get_search(pattern) for pattern in reverse_greps]
 
-        def _filter(data, greps, reverse_greps):
-            return all(_matches(data, pattern) for pattern in greps) and \
-                not (reverse_greps and all(_matches(data, pattern) for pattern in reverse_greps))
+        def _row_filter(row):
+            texts = _RowTexts(row)
+            return all(texts.search(pattern) for pattern in greps) and \
+                not (reverse_greps and all(texts.search(pattern) for pattern in reverse_greps))
+        return _row_filter
 
-        if not greps and not reverse_greps:
-            return data
-        if isinstance(data, dict):
-            return {key: value for key, value in data.iteritems() if _filter(value, greps, reverse_greps)}
-        if isinstance(data, (list, tuple)):
-            return [value for value in data if _filter(value, greps, reverse_greps)]
-        return _filter(value, greps, reverse_greps)
+    def _get_column_filter(self):
+        column_patterns = self._modifiers.get('columns', [])
+        column_anti_patterns = self._modifiers.get('columns-v', [])
+        if not column_patterns and not column_anti_patterns:
+            return None
+        search = _get_combined_search(column_patterns) if column_patterns else None
+        anti_search = _get_combined_search(column_anti_patterns) if column_anti_patterns else None
+        keep_column = {}  # the rows usually share the same keys, so the decision is made once per key
 
-    def _filter_columns(self, data, column_patterns, column_anti_patterns):
-        def _filter_columns_in_dict(data, column_patterns, column_anti_patterns):
+        def _column_filter(data):
             if isinstance(data, dict):
-                data = {key: value for key, value in data.iteritems() if
-                        (not column_patterns or any(pattern.search(key) for pattern in column_patterns)) and
-                        (not column_anti_patterns or not any(pattern.search(key) for pattern in column_anti_patterns))}
+                filtered = {}
+                for key, value in data.iteritems():
+                    keep = keep_column.get(key)
+                    if keep is None:
+                        keep = (not search or bool(search(key))) and (not anti_search or not anti_search(key))
+                        keep_column[key] = keep
+                    if keep:
+                        filtered[key] = value
+                data = filtered
             return data
-
-        if not column_patterns and not column_anti_patterns:
-            return data
-        if isinstance(data, (list, tuple)):
-            return [_filter_columns_in_dict(value, column_patterns, column_anti_patterns) for value in data]
-        else:
-            return _filter_columns_in_dict(data, column_patterns, column_anti_patterns)
+        return _column_filter
 
     def parse_modifiers(self, args):
 
         self._modifiers, unrecognized_modifiers = modifier.parse_modifiers(self.MODIFIERS, args)
         return unrecognized_modifiers
 
-    def filter_data(self, data):
+    def _get_greps(self):
         greps = self._modifiers.get('grep', []) + self._modifiers.get('grep-i', [])
         reverse_greps = []
         for name in ('grep-v', 'grep-vi', 'grep-iv', 'grep-v-i', 'grep-i-v'):
             reverse_greps.extend(self._modifiers.get(name, []))
-        data = self._filter_data(data, greps, reverse_greps)
-        data = self._filter_columns(data, self._modifiers.get('columns', []), self._modifiers.get('columns-v', []))
-        if isinstance(data, list):
-            if 'head' in self._modifiers:
-                data = data[:self._modifiers['head']]
-            if 'tail' in self._modifiers:
-                data = data[-self._modifiers['tail']:]
+        return greps, reverse_greps
+
+    def filter_data(self, data):
+        row_filter = self._get_row_filter()
+        column_filter = self._get_column_filter()
+        if isinstance(data, list) or (isinstance(data, tuple) and (row_filter or column_filter)):
+            return list(self.filter_rows(data))
+        if isinstance(data, dict):
+            if row_filter:
+                data = {key: value for key, value in data.iteritems() if row_filter(value)}
+        elif row_filter:
+            data = row_filter(data)
+        if column_filter:
+            data = column_filter(data)
+        return self._sort(data)
+
+    def _sort(self, data):
         sort_by = self._modifiers.get('sort')
-        if sort_by:
-            reverse, sort_key = sort_by
-            if isinstance(data, (list, tuple)) and all(isinstance(row, dict) for row in data):
-                data.sort(key=lambda row: row.get(sort_key), reverse=reverse)
+        if sort_by and isinstance(data, (list, tuple)) and all(isinstance(row, dict) for row in data):
+            # stable sorts from the last key to the first, each in its own order
+            for reverse, sort_key in reversed(sort_by):
+                data.sort(key=lambda row, sort_key=sort_key: _typed_key(row.get(sort_key)), reverse=reverse)
         return data
 
+    def _top(self, rows, count):
+        # keeps only the best count rows in a heap while reading the rows
+        sort_by = self._modifiers.get('sort')
+        if not sort_by:
+            return itertools.islice(rows, max(count, 0))
+
+        def _row_key(row):
+            values = [_typed_key(row.get(sort_key) if isinstance(row, dict) else None) for _, sort_key in sort_by]
+            return tuple(_Descending(value) if reverse else value for (reverse, _), value in zip(sort_by, values))
+        return iter(heapq.nsmallest(count, rows, key=_row_key))
+
+    def _iter_filtered_rows(self, rows):
+        row_filter = self._get_row_filter()
+        column_filter = self._get_column_filter()
+        for row in rows:
+            if row_filter and not row_filter(row):
+                continue
+            yield column_filter(row) if column_filter else row
+
+    def filter_rows(self, rows):
+        # filters an iterable of rows in a single pass, yielding the rows lazily unless tail or sort are given.
+        # reading the rows stops once head rows are accepted.
+        rows = self._iter_filtered_rows(rows)
+        if 'head' in self._modifiers:
+            head = self._modifiers['head']
+            rows = itertools.islice(rows, head) if head >= 0 else iter(list(rows)[:head])
+        if 'tail' in self._modifiers:
+            tail = self._modifiers['tail']
+            rows = iter(collections.deque(rows, maxlen=tail) if tail > 0 else list(rows)[-tail:])
+        if 'top' in self._modifiers:
+            rows = self._top(rows, self._modifiers['top'])
+        elif self._modifiers.get('sort'):
+            rows = iter(self._sort(list(rows)))
+        return rows
+
     def get_modifier_names(self):
         return self.MODIFIERS.keys()
 
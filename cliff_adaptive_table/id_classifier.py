@@ -0,0 +1,46 @@
+import re
+
+
+_HEX = '[0-9a-fA-F]'
+ID_PATTERNS = {
+    'hex': '%s{32}|%s{40}|%s{64}' % (_HEX, _HEX, _HEX),
+    'uuid': '{0}{{8}}-{0}{{4}}-{0}{{4}}-{0}{{4}}-{0}{{12}}'.format(_HEX),
+    'ipv4': '[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}',
+    'ipv6': '(?=.*:.*:)(?:{0}{{1,4}}|:)(?::{0}{{0,4}}){{1,7}}(?:\.[0-9]{{1,3}}){{0,3}}'.format(_HEX),
+    'mac': '{0}{{2}}(?:[:-]{0}{{2}}){{5}}'.format(_HEX),
+}
+DEFAULT_ID_PATTERNS = ['hex', 'uuid', 'ipv4', 'ipv6', 'mac']
+
+
+class IdClassifier(object):
+    # all the ID patterns are matched by a single regular expression, and the verdicts of the most
+    # recently classified values are kept in two generations of at most _CACHE_SIZE values each
+    _CACHE_SIZE = 10000
+
+    def __init__(self, patterns):
+        self._match = re.compile('(?:%s)\\Z' % '|'.join('(?:%s)' % pattern for pattern in patterns)).match if patterns else None
+        self._recent = {}
+        self._old = {}
+
+    def is_id(self, value):
+        verdict = self._recent.get(value)
+        if verdict is None:
+            verdict = self._old.get(value)
+            if verdict is None:
+                verdict = bool(self._match and self._match(value))
+            if len(self._recent) >= self._CACHE_SIZE:
+                self._old = self._recent
+                self._recent = {}
+            self._recent[value] = verdict
+        return verdict
+
+
+_classifiers = {}
+
+
+def get_id_classifier(names, regexes=()):
+    # classifiers are shared by all the tables that use the same patterns
+    patterns = tuple(ID_PATTERNS[name] for name in names) + tuple(regex.pattern for regex in regexes)
+    if patterns not in _classifiers:
+        _classifiers[patterns] = IdClassifier(patterns)
+    return _classifiers[patterns]
@@ -0,0 +1,30 @@
+DEFAULT_COLUMN_ORDER = ['id', 'name', 'status', 'state']
+
+
+class KeyOrder(object):
+    # the listed columns come first in the listed order (case-insensitive), and the other columns after them in
+    # alphabetical order. the rank of every key and the order of every set of keys are computed once, and the
+    # sorted lists are shared, so they must not be changed
+    _MAX_SIZE = 10000
+
+    def __init__(self, column_order):
+        self._column_value = {key.lower(): index - len(column_order) for index, key in enumerate(column_order or ())}
+        self._ranks = {}
+        self._orders = {}
+
+    def rank(self, key):
+        rank = self._ranks.get(key)
+        if rank is None:
+            rank = (self._column_value.get(unicode(key).lower(), 0), key) if self._column_value else (0, key)
+            if len(self._ranks) < self._MAX_SIZE:
+                self._ranks[key] = rank
+        return rank
+
+    def sorted_keys(self, keys):
+        keys = frozenset(keys)
+        ordered = self._orders.get(keys)
+        if ordered is None:
+            ordered = sorted(keys, key=self.rank)
+            if len(self._orders) < self._MAX_SIZE:
+                self._orders[keys] = ordered
+        return ordered
@@ -10,10 +10,24 @@ def boolean(recognized, key, value):
                        'n': False, 'no': False, 'f': False, 'false': False}[value.lower()]
 
 
+def choices_csv(choices):
+    def parse(recognized, key, value):
+        values = value.split(',')
+        assert all(item in choices for item in values)
+        recognized[key] = values
+    return parse
+
+
 def to_int(recognized, key, value):
     recognized[key] = int(value)
 
 
+def positive_int(recognized, key, value):
+    number = int(value)
+    assert number > 0
+    recognized[key] = number
+
+
 def to_str(recognized, key, value):
     recognized[key] = value
 
@@ -26,12 +40,15 @@ def append_regex(recognized, key, value, flags=0):
 
 
 def sort(recognized, key, value):
-    tokens = value.split(':', 1)
-    if len(tokens) > 1:
-        assert tokens[0] in ('a', 'A', 'd', 'D')
-    else:
-        tokens = ['a', tokens[0]]
-    recognized[key] = (tokens[0] in ('d', 'D'), tokens[1])
+    sort_keys = []
+    for item in value.split(','):
+        tokens = item.split(':', 1)
+        if len(tokens) > 1:
+            assert tokens[0] in ('a', 'A', 'd', 'D')
+        else:
+            tokens = ['a', tokens[0]]
+        sort_keys.append((tokens[0] in ('d', 'D'), tokens[1]))
+    recognized[key] = sort_keys
 
 
 def append_case_insensitive_regex(recognized, key, value):
@@ -0,0 +1,186 @@
+import re
+import json
+import itertools
+from json.encoder import encode_basestring_ascii
+
+from key_order import DEFAULT_COLUMN_ORDER, KeyOrder
+import modifier
+
+
+RECORD_WRITER_HELP = {
+    'description': 'Writes each row as soon as it is filtered, without laying out a table. Nested dicts are flattened into columns with dotted names, e.g. spec.size. Other nested values are written as JSON. Rows that are not dicts are written in a column with an empty name.',
+    'modifiers':
+    [
+        {
+            'modifier': 'column-order=<csv>',
+            'description': 'Orders the columns according to a comma-separated list of column names. The unlisted columns are written after the listed ones in alphabetical order. The keys of nested dicts are ordered the same way.',
+            'default': 'name,id,status,state'
+        },
+        {
+            'modifier': 'stream-sample=<n>',
+            'description': 'Sets the number of rows whose columns are written by csv and tsv, since the header is written before the other rows are read. The keys of nested dicts that appear only in later rows are left out.',
+            'default': '100',
+        },
+    ]
+}
+
+
+class Format(object):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+    TSV = 'tsv'
+
+
+_TSV_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'}
+_TSV_ESCAPED = re.compile(u'[\\\\\t\n\r]')
+_CSV_QUOTED = re.compile(u'[,"\n\r]').search
+
+
+def _number_text(value):
+    return repr(value) if value - value == 0 else json.dumps(value)  # NaN and infinities as in JSON
+
+
+def _bool_text(value):
+    return 'true' if value else 'false'
+
+
+# the text of the scalar values of each type, the same in CSV and TSV as in JSON except for strings and None
+_TEXT = {unicode: lambda value: value,
+         str: lambda value: unicode(value, 'utf8', 'replace'),
+         type(None): lambda value: u'',
+         int: repr,
+         long: str,
+         float: _number_text,
+         bool: _bool_text}
+_JSON = {unicode: encode_basestring_ascii,
+         str: encode_basestring_ascii,
+         type(None): lambda value: 'null',
+         int: repr,
+         long: str,
+         float: _number_text,
+         bool: _bool_text}
+
+
+def _as_dict(item):
+    return item if isinstance(item, dict) else {'': item}
+
+
+class RecordWriter(object):
+    # writes dict rows as NDJSON, CSV or TSV records, one row at a time, in the column order of AdaptiveTable
+    _MODIFIERS = {'column-order': modifier.csv,
+                  'stream-sample': modifier.to_int}
+    _STREAM_SAMPLE = 100
+
+    def __init__(self, output_format, column_order=DEFAULT_COLUMN_ORDER, stream_sample=_STREAM_SAMPLE):
+        assert output_format in (Format.NDJSON, Format.CSV, Format.TSV)
+        self._format = output_format
+        self._column_order = column_order
+        self._stream_sample = stream_sample
+        self._key_order = KeyOrder(column_order)
+        self._json_keys = {}
+        self._encode = json.JSONEncoder(default=unicode).encode
+
+    def parse_modifiers(self, args):
+        recognized, unrecognized = modifier.parse_modifiers(self._MODIFIERS, args)
+        for key, value in recognized.iteritems():
+            setattr(self, '_' + key.replace('-', '_'), value)
+        self._key_order = KeyOrder(self._column_order)
+        return unrecognized
+
+    def get_modifier_names(self):
+        return self._MODIFIERS.keys()
+
+    def help(self):
+        return RECORD_WRITER_HELP
+
+    def write_rows(self, rows, stdout):
+        # rows that are not dicts are written as dicts with a single empty string key, as in AdaptiveTable
+        rows = itertools.imap(_as_dict, rows)
+        if self._format == Format.NDJSON:
+            for item in rows:
+                stdout.write(self._format_json(item))
+                stdout.write('\n')
+            return
+        rows = iter(rows)
+        sample = list(itertools.islice(rows, self._stream_sample))
+        if not sample:
+            return
+        columns = self._get_columns(sample)
+        format_line = self._format_csv if self._format == Format.CSV else self._format_tsv
+        stdout.write(format_line([self._get_column_name(path) for path in columns]) + '\n')
+        to_text = self._to_text
+        if all(len(path) == 1 for path in columns):
+            keys = [path[0] for path in columns]
+            for item in itertools.chain(sample, rows):
+                stdout.write(format_line([to_text(value) for value in map(item.get, keys)]) + '\n')
+        else:
+            prefixes = set(path[:length] for path in columns for length in xrange(1, len(path)))
+            getters = [self._get_value_getter(path, path in prefixes) for path in columns]
+            for item in itertools.chain(sample, rows):
+                stdout.write(format_line([to_text(get(item)) for get in getters]) + '\n')
+
+    def write_one(self, item, stdout):
+        self.write_rows([item], stdout)
+
+    def _iter_paths(self, item, prefix=()):
+        # the (path, value) of every value of a row, flattening non-empty nested dicts
+        for key in self._key_order.sorted_keys(item):
+            value = item[key]
+            if isinstance(value, dict) and value:
+                for path, nested_value in self._iter_paths(value, prefix + (key,)):
+                    yield path, nested_value
+            else:
+                yield prefix + (key,), value
+
+    def _get_columns(self, rows):
+        paths = set()
+        for item in rows:
+            paths.update(path for path, _ in self._iter_paths(item))
+        return sorted(paths, key=lambda path: [self._key_order.rank(key) for key in path])
+
+    def _get_column_name(self, path):
+        return '.'.join(unicode(key) for key in path)
+
+    def _get_value_getter(self, path, flattened):
+        # the column of a path that is flattened in some rows is left empty in them, since its values are written
+        # in the columns of the nested keys
+        def get(item):
+            for key in path:
+                if not isinstance(item, dict):
+                    return None
+                item = item.get(key)
+            if flattened and isinstance(item, dict) and item:
+                return None
+            return item
+        if len(path) == 1 and not flattened:
+            key = path[0]
+            return lambda item: item.get(key)
+        return get
+
+    def _format_json(self, item):
+        parts = []
+        for path, value in self._iter_paths(item):
+            key = self._json_keys.get(path)
+            if key is None:
+                key = self._json_keys[path] = encode_basestring_ascii(self._get_column_name(path)) + ': '
+            encode = _JSON.get(type(value))
+            parts.append(key + (encode(value) if encode else self._encode(value)))
+        return '{%s}' % ', '.join(parts)
+
+    def _to_text(self, value):
+        to_text = _TEXT.get(type(value))
+        if to_text:
+            return to_text(value)
+        if isinstance(value, (list, tuple, dict)):
+            return self._encode(value)
+        return unicode(value)
+
+    def _format_csv(self, texts):
+        return u','.join([u'"%s"' % text.replace('"', '""') if _CSV_QUOTED(text) else text for text in texts])
+
+    def _format_tsv(self, texts):
+        search = _TSV_ESCAPED.search
+        return u'\t'.join([self._escape_tsv(text) if search(text) else text for text in texts])
+
+    def _escape_tsv(self, text):
+        return _TSV_ESCAPED.sub(lambda match: _TSV_ESCAPES[match.group()], text)
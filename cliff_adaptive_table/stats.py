@@ -0,0 +1,50 @@
+import sys
+import json
+
+
+class Stats(object):
+    # timings and counters of formatting one table. they are collected only when stats are enabled, so the
+    # instrumented code checks for a collector before reading the clock
+    def __init__(self):
+        self._phases = {}
+        self._probes = []
+        self._values = {}
+        self._tables = 0
+        self._max_depth = 0
+
+    def add_phase(self, name, seconds):
+        self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    def add_probe(self, max_str_length, compact, width, fits, seconds):
+        self._probes.append({'max_str_length': max_str_length, 'compact': compact, 'width': width, 'fits': fits,
+                             'ms': _to_ms(seconds)})
+
+    def add_table(self, depth):
+        self._tables += 1
+        self._max_depth = max(self._max_depth, depth)
+
+    def set(self, name, value):
+        self._values[name] = value
+
+    def to_dict(self):
+        result = dict(self._values)
+        result.update({'phases_ms': {name: _to_ms(seconds) for name, seconds in self._phases.iteritems()},
+                       'probes': list(self._probes),
+                       'num_probes': len(self._probes),
+                       'tables': self._tables,
+                       'max_table_depth': self._max_depth})
+        return result
+
+
+def _to_ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def write_stats(stats, path=None):
+    # writes the stats as one line of JSON, appended to the file or written to stderr
+    line = json.dumps(stats, sort_keys=True) + '\n'
+    if path:
+        with open(path, 'a') as f:
+            f.write(line)
+    else:
+        sys.stderr.write(line)
@@ -0,0 +1,163 @@
+import itertools
+
+from adaptive_table_def import TableRow, text_width
+
+
+_CURSOR_UP = '\033[%dA'
+_CURSOR_DOWN = '\033[%dB'
+_CLEAR_LINE = '\033[K'
+_CLEAR_SCREEN_DOWN = '\033[J'
+
+
+class _RowsTable(object):
+    # a formatted table of rows with the lines of each row, so changed rows can be formatted again with the same layout
+    def __init__(self, width, keys, compact, max_str_length, settings, widths, table_def, header):
+        self.width = width
+        self.keys = keys
+        self.compact = compact
+        self.max_str_length = max_str_length
+        self.settings = settings
+        self.widths = widths
+        self.table_def = table_def
+        self.header = header
+        self.rows = {}
+
+    def lines(self, ids):
+        lines = []
+        prev_max_lines = 0
+        for row_index, (row, row_lines) in enumerate(itertools.chain([self.header], (self.rows[row_id][1:] for row_id in ids))):
+            sep = self.table_def.get_separator(row_index, row.height, prev_max_lines)
+            if sep:
+                lines.append(sep)
+            lines.extend(row_lines)
+            prev_max_lines = row.height
+        lines.append(self.table_def.get_end_separator())
+        return lines
+
+
+class TableUpdater(object):
+    # formats new versions of a list of rows, matching the rows by their id column. only the new and changed rows are
+    # formatted again, as long as they fit in the columns of the displayed table, and update() returns the text that
+    # rewrites only the changed lines on the terminal. rows are compared with ==, so changed rows must be new objects.
+    # tables of fewer than two rows, and tables with split-table, transpose or count, are formatted whole every time
+    def __init__(self, table, id_column='id'):
+        self._table = table
+        self._id_column = id_column
+        self._rows_table = None
+        self._lines = []
+
+    def update(self, data):
+        # returns the text to write after the text returned by the previous call
+        ids = self._get_ids(data)
+        lines = None
+        self._table._update_width()
+        if ids is not None and len(ids) > 1 and self._rows_table is not None and self._rows_table.width == self._table._width:
+            lines = self._update_rows(data, ids)
+        if lines is None:
+            return self._rewrite(self._format_all(data, ids))
+        text = self._update_lines(lines)
+        self._lines = lines
+        return text
+
+    def format(self, data):
+        # formats the whole table, and returns it without updating the terminal
+        self._lines = self._format_all(data, self._get_ids(data))
+        return '\n'.join(self._lines)
+
+    def _get_ids(self, data):
+        if not isinstance(data, (list, tuple)) or not all(isinstance(item, dict) for item in data):
+            return None
+        try:
+            ids = [item[self._id_column] for item in data]
+            if len(set(ids)) < len(ids):
+                return None
+        except (KeyError, TypeError):
+            return None
+        return ids
+
+    def _format_all(self, data, ids):
+        table = self._table
+        if ids is None or len(data) < 2 or table._split_table or table._transpose or table._count:
+            # the rows are not displayed one per line of the table, so the changed rows can't be formatted alone
+            self._rows_table = None
+            return table.format(data).split('\n')
+        with table._formatting():
+            compact, max_str_length = table._find_rows_layout(data)
+            table._set_layout_stats(compact, max_str_length)
+            keys = table._get_keys_of_a_list_of_dicts(data)
+            all_data, widths, table_def = table._format_rows_table(data, keys, compact, max_str_length)
+            rows_table = _RowsTable(table._width, keys, compact, max_str_length, table._get_settings(), widths, table_def,
+                                    (all_data[0], table_def.render_row(all_data[0])))
+        for row_id, item, row in itertools.izip(ids, data, all_data[1:]):
+            rows_table.rows[row_id] = (item, row, table_def.render_row(row, self._get_row_colors(keys, item)))
+        self._rows_table = rows_table
+        return rows_table.lines(ids)
+
+    def _update_rows(self, data, ids):
+        # formats the new and changed rows, or returns None if the whole table has to be formatted again
+        table = self._table
+        rows_table = self._rows_table
+        if table._get_keys_of_a_list_of_dicts(data) != rows_table.keys:
+            return None
+        changed = [(row_id, item) for row_id, item in itertools.izip(ids, data)
+                   if row_id not in rows_table.rows or rows_table.rows[row_id][0] != item]
+        rows = {}
+        settings = table._get_settings()
+        table._set_settings(rows_table.settings)
+        try:
+            for row_id, item in changed:
+                cells = table._format_row(item, rows_table.keys, rows_table.compact, rows_table.max_str_length)
+                row = TableRow([unicode(cell) for cell in cells])
+                if any(text_width(cell) > width for cell, width in itertools.izip(row.cells, rows_table.widths)):
+                    return None
+                rows[row_id] = (item, row, rows_table.table_def.render_row(row, self._get_row_colors(rows_table.keys, item)))
+        finally:
+            table._set_settings(settings)
+        current = set(ids)
+        for row_id in [row_id for row_id in rows_table.rows if row_id not in current]:
+            del rows_table.rows[row_id]
+        rows_table.rows.update(rows)
+        return rows_table.lines(ids)
+
+    def _get_row_colors(self, keys, item):
+        return self._table._get_row_colors(keys, item) if self._table._color else None
+
+    def _rewrite(self, lines):
+        # clears the previous table if it is on the screen, and writes the new one
+        text = '\n'.join(lines) + '\n'
+        if self._lines and len(self._lines) < self._table._get_terminal_size()[0]:
+            text = _CURSOR_UP % len(self._lines) + '\r' + _CLEAR_SCREEN_DOWN + text
+        self._lines = lines
+        return text
+
+    def _update_lines(self, lines):
+        # the cursor is below the previous table. tables taller than the screen are written again, since their
+        # first lines can't be reached
+        old_lines = self._lines
+        if len(old_lines) >= self._table._get_terminal_size()[0]:
+            return '\n'.join(lines) + '\n'
+        parts = []
+        position = [len(old_lines)]
+
+        def _move(line_index):
+            if line_index == position[0]:
+                return
+            if line_index < position[0]:
+                parts.append(_CURSOR_UP % (position[0] - line_index))
+            elif line_index > position[0]:
+                parts.append(_CURSOR_DOWN % (line_index - position[0]))
+            parts.append('\r')
+            position[0] = line_index
+
+        for line_index, (old_line, line) in enumerate(itertools.izip(old_lines, lines)):
+            if old_line != line:
+                _move(line_index)
+                parts.append(line + _CLEAR_LINE)
+        if len(lines) > len(old_lines):
+            _move(len(old_lines))
+            parts.append('\n'.join(lines[len(old_lines):]) + '\n')
+        else:
+            _move(len(lines))
+            if len(lines) < len(old_lines):
+                parts.append(_CLEAR_SCREEN_DOWN)
+        return ''.join(parts)
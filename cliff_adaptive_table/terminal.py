@@ -0,0 +1,70 @@
+import os
+import fcntl
+import signal
+import struct
+import termios
+
+
+_UNKNOWN = object()
+_size = _UNKNOWN
+
+
+def get_terminal_width(non_tty_width):
+    # COLUMNS overrides the width of the terminal, and non_tty_width is used when the output is not a terminal
+    columns = os.environ.get('COLUMNS', '')
+    if columns.isdigit() and int(columns) > 0:
+        return int(columns)
+    size = get_terminal_size()
+    return size[1] if size else non_tty_width
+
+
+def get_terminal_size():
+    # the (rows, columns) of the terminal of the standard streams, or None if none of them is a terminal. the size
+    # is kept for the process until the terminal is resized, which is known from SIGWINCH while it is handled by
+    # _on_resize. otherwise, e.g. if the process has its own handler of SIGWINCH, the size is read on every call
+    global _size
+    if _size is not _UNKNOWN and _is_resize_handler_installed():
+        return _size
+    size = _read_size()
+    if size is not None and _install_resize_handler():
+        _size = size
+    return size
+
+
+def _read_size():
+    for fd in (0, 1, 2):
+        try:
+            rows, columns = struct.unpack('hh', fcntl.ioctl(fd, termios.TIOCGWINSZ, '1234'))
+        except Exception:
+            continue
+        if columns > 0:
+            return rows, columns
+    return None
+
+
+def _on_resize(signum, frame):
+    global _size
+    _size = _UNKNOWN
+
+
+def _is_resize_handler_installed():
+    try:
+        return signal.getsignal(signal.SIGWINCH) is _on_resize
+    except AttributeError:  # no SIGWINCH on this platform
+        return False
+
+
+def _install_resize_handler():
+    # installs _on_resize only if SIGWINCH has the default handler, so a handler of the program is never replaced
+    try:
+        handler = signal.getsignal(signal.SIGWINCH)
+        if handler is _on_resize:
+            return True
+        if handler != signal.SIG_DFL:
+            return False
+        signal.signal(signal.SIGWINCH, _on_resize)
+        # system calls interrupted by a resize are restarted instead of failing with EINTR
+        signal.siginterrupt(signal.SIGWINCH, False)
+    except (AttributeError, ValueError):  # no SIGWINCH on this platform, or not the main thread
+        return False
+    return True
@@ -0,0 +1,96 @@
+import bisect
+
+
+def simple_split(string, max_length):
+    return [string[index:index + max_length] for index in xrange(0, len(string), max_length)]
+
+
+class Words(object):
+    # the words of a string and their offsets in the string made of the words and one space after each word,
+    # so that the words fitting in a line are found by a binary search for any line length
+    __slots__ = ('words', 'offsets')
+
+    def __init__(self, string):
+        self.words = string.split()
+        self.offsets = [0]
+        for word in self.words:
+            self.offsets.append(self.offsets[-1] + len(word) + 1)
+
+    def wrap(self, max_length, split_long_words=True):
+        # splits between words, and splits words only if they are longer than max_length (and split_long_words)
+        words = self.words
+        offsets = self.offsets
+        lines = []
+        current = []
+        current_length = 0
+        index = 0
+        while index < len(words):
+            limit = offsets[index] + max_length - current_length + (0 if current else 1)
+            end = bisect.bisect_right(offsets, limit, index) - 1
+            if end > index:
+                current_length += offsets[end] - offsets[index] - (0 if current else 1)
+                current.extend(words[index:end])
+                index = end
+                continue
+            word = words[index]
+            if len(word) <= max_length:
+                lines.append(' '.join(current))
+                current = [word]
+                current_length = len(word)
+            elif not split_long_words:
+                if current:
+                    lines.append(' '.join(current))
+                lines.append(word)
+                current = []
+                current_length = 0
+            else:
+                space_left = max(0, max_length - current_length - (1 if current else 0))
+                if space_left:
+                    current.append(word[:space_left])
+                    lines.append(' '.join(current))
+                elif current:
+                    lines.append(' '.join(current))
+                sub_lines = simple_split(word[space_left:], max_length)
+                lines.extend(sub_lines[:-1])
+                current = [sub_lines[-1]]
+                current_length = len(sub_lines[-1])
+            index += 1
+        if current:
+            lines.append(' '.join(current))
+        return lines
+
+
+class WrapCache(object):
+    # results are kept until the cache is full. new results are not kept after that, since the
+    # strings of a table are wrapped in the same order for every string length that is tried
+    _MAX_SIZE = 100000
+
+    def __init__(self, max_size=_MAX_SIZE):
+        self._max_size = max_size
+        self._results = {}
+        self._words = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, key, result):
+        if len(self._results) < self._max_size:
+            self._results[key] = result
+
+    def words(self, string):
+        words = self._words.get(string)
+        if words is None:
+            words = Words(string)
+            if len(self._words) < self._max_size:
+                self._words[string] = words
+        return words
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._results)}
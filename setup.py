@@ -29,6 +29,7 @@ setup(
 
     provides=['cliff_adaptive_table'],
     install_requires=[],
+    extras_require={'async': ['futures', 'trollius']},
 
     namespace_packages=[],
     packages=find_packages(),
@@ -37,9 +38,15 @@ setup(
     entry_points={
         'cliff.formatter.list': [
             'adaptive_table = cliff_adaptive_table.cliff_adaptive_table:AdaptiveTableFormatter',
+            'adaptive_ndjson = cliff_adaptive_table.cliff_adaptive_table:NdjsonFormatter',
+            'adaptive_csv = cliff_adaptive_table.cliff_adaptive_table:CsvFormatter',
+            'adaptive_tsv = cliff_adaptive_table.cliff_adaptive_table:TsvFormatter',
         ],
         'cliff.formatter.show': [
             'adaptive_table = cliff_adaptive_table.cliff_adaptive_table:AdaptiveTableFormatter',
+            'adaptive_ndjson = cliff_adaptive_table.cliff_adaptive_table:NdjsonFormatter',
+            'adaptive_csv = cliff_adaptive_table.cliff_adaptive_table:CsvFormatter',
+            'adaptive_tsv = cliff_adaptive_table.cliff_adaptive_table:TsvFormatter',
         ],
     },
 )
@@ -0,0 +1,55 @@
+import unittest
+
+from cliff_adaptive_table.adaptive_table import AdaptiveTable, Degradation
+
+
+class TestEmptyDicts(unittest.TestCase):
+    # an empty dict in a list is a table row without cells, which is displayed as an empty cell
+    def _format(self, data):
+        table = AdaptiveTable(width=80, ttl=None)
+        output = table.format(data)
+        self.assertEqual(table.get_degradation(), Degradation.NONE)
+        return output
+
+    def test_empty_dict_in_a_list(self):
+        output = self._format([{'name': 'a', 'tags': [{}]}, {'name': 'b', 'tags': 'x'}])
+        self.assertEqual(output, '\n'.join(['+------+------+',
+                                            '| name | tags |',
+                                            '+======+======+',
+                                            '| a    |      |',
+                                            '| b    | x    |',
+                                            '+------+------+']))
+
+    def test_empty_dict_in_a_dict(self):
+        output = self._format({'name': 'a', 'tags': [{}]})
+        self.assertEqual(output, '\n'.join(['+------+---+',
+                                            '| name | a |',
+                                            '| tags |   |',
+                                            '+------+---+']))
+
+    def test_dicts_without_keys(self):
+        # e.g. the rows left by a columns modifier that matches no column
+        table = AdaptiveTable(width=80, ttl=None)
+        table.parse_modifiers(['count=true'])
+        self.assertEqual(table.format([{}, {}]), '\nobject count: 2')
+
+
+class TestMaxDepth(unittest.TestCase):
+    def test_values_below_one_are_invalid(self):
+        table = AdaptiveTable(width=80, ttl=None)
+        self.assertEqual(table.parse_modifiers(['max-depth=0', 'max-depth=-1']), ['max-depth=0', 'max-depth=-1'])
+        self.assertEqual(table.parse_modifiers(['max-depth=1']), [])
+
+    def test_json_is_wrapped(self):
+        table = AdaptiveTable(width=30, ttl=None)
+        table.parse_modifiers(['max-depth=1'])
+        output = table.format({'a': {'b': 'x ' * 20}})
+        self.assertEqual(output, '\n'.join(['+---+-----------------------+',
+                                            '| a | {"b": "x x x x x x x  |',
+                                            '|   | x x x x x x x x x x x |',
+                                            '|   | x x "}                |',
+                                            '+---+-----------------------+']))
+
+
+if __name__ == '__main__':
+    unittest.main()
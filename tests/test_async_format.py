@@ -0,0 +1,120 @@
+import unittest
+
+from cliff_adaptive_table.adaptive_table import AdaptiveTable, Degradation
+from cliff_adaptive_table.filter_data import FilterData
+
+try:
+    import trollius
+    from trollius import From, Return
+    from cliff_adaptive_table import async_format
+except ImportError:  # the async extra is not installed
+    trollius = None
+
+
+class _Rows(object):
+    # an async iterable of rows. if it doesn't end, it waits for another row after the last one
+    def __init__(self, rows, end=True):
+        self._rows = iter(rows)
+        self._end = end
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = trollius.Future()
+        try:
+            future.set_result(next(self._rows))
+        except StopIteration:
+            if self._end:
+                future.set_exception(async_format.StopAsyncIteration())
+        return future
+
+
+def _read(lines, last=None):
+    # reads lines until the end, or until a line that contains last
+    result = []
+    while not result or last is None or last not in result[-1]:
+        try:
+            line = yield From(lines.__anext__())
+        except async_format.StopAsyncIteration:
+            break
+        result.append(line)
+    raise Return(result)
+
+
+@unittest.skipIf(trollius is None, 'trollius and futures are not installed')
+class TestAsyncFormat(unittest.TestCase):
+    _STREAM = ['stream=true', 'stream-sample=2']
+
+    def setUp(self):
+        self.loop = trollius.new_event_loop()
+        trollius.set_event_loop(self.loop)
+        self.rows = [{'id': index, 'name': 'host-%d' % index} for index in range(5)]
+        self.lines = []
+
+    def tearDown(self):
+        # the jobs call back into the event loop, so they are stopped before it is closed
+        for lines in self.lines:
+            lines.close()
+        if self.lines:
+            self._wait(trollius.wait([lines._producer for lines in self.lines]))
+        self.loop.close()
+        trollius.set_event_loop(None)
+
+    def _table(self, modifiers=()):
+        table = AdaptiveTable(width=80, ttl=None)
+        table.parse_modifiers(list(modifiers))
+        return table
+
+    def _wait(self, future, timeout=5):
+        return self.loop.run_until_complete(trollius.wait_for(future, timeout))
+
+    def _lines(self, table, rows):
+        lines = table.aformat_lines(rows)
+        self.lines.append(lines)
+        return lines
+
+    def _start_reading(self, last):
+        # a task that waits for a line after the line that contains last, which is never formatted
+        lines = self._lines(self._table(self._STREAM), _Rows(self.rows[:3], end=False))
+        self.assertEqual(self._wait(self.loop.create_task(_read(lines, last)))[-1], u'| 2  | host-2 |')
+        task = self.loop.create_task(_read(lines))
+        self.loop.run_until_complete(trollius.sleep(0.2))
+        self.assertFalse(task.done())
+        return lines, task
+
+    def test_aformat(self):
+        table = self._table()
+        self.assertEqual(self._wait(table.aformat(self.rows)), self._table().format(self.rows))
+        self.assertEqual(table.get_degradation(), Degradation.NONE)
+
+    def test_aformat_of_async_rows(self):
+        filter_data = FilterData()
+        filter_data.parse_modifiers(['grep=host-[12]'])
+        output = self._wait(self._table().aformat(_Rows(self.rows), filter_data))
+        self.assertEqual(output, self._table().format(self.rows[1:3]))
+
+    def test_aformat_lines(self):
+        lines = self._lines(self._table(), self.rows)
+        self.assertEqual(self._wait(self.loop.create_task(_read(lines))), self._table().format(self.rows).split('\n'))
+
+    def test_aformat_lines_of_a_streamed_table(self):
+        lines = self._lines(self._table(self._STREAM), _Rows(self.rows))
+        expected = list(self._table(self._STREAM).format_stream(self.rows))
+        self.assertEqual(self._wait(self.loop.create_task(_read(lines))), expected)
+
+    def test_cancel_the_awaiting_task(self):
+        lines, task = self._start_reading('host-2')
+        task.cancel()
+        self.assertRaises(trollius.CancelledError, self.loop.run_until_complete, task)
+        self.assertTrue(lines._job.cancelled.is_set())
+
+    def test_close_while_a_line_is_awaited(self):
+        lines, task = self._start_reading('host-2')
+        lines.close()
+        self.assertEqual(self._wait(task), [])
+        self.assertTrue(lines._job.cancelled.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from StringIO import StringIO
+
+from cliff_adaptive_table.record_writer import Format, RecordWriter
+
+
+class TestRecordWriter(unittest.TestCase):
+    def _write(self, output_format, rows):
+        output = StringIO()
+        RecordWriter(output_format).write_rows(rows, output)
+        return output.getvalue()
+
+    def test_flattened_dicts(self):
+        # the spec column is empty in the rows whose spec is written in spec.size
+        rows = [{'id': 1, 'spec': {'size': 3}}, {'id': 2, 'spec': None}, {'id': 3, 'spec': {}}]
+        self.assertEqual(self._write(Format.CSV, rows), 'id,spec,spec.size\n1,,3\n2,,\n3,{},\n')
+        self.assertEqual(self._write(Format.TSV, rows), 'id\tspec\tspec.size\n1\t\t3\n2\t\t\n3\t{}\t\n')
+        self.assertEqual(self._write(Format.NDJSON, rows),
+                         '{"id": 1, "spec.size": 3}\n{"id": 2, "spec": null}\n{"id": 3, "spec": {}}\n')
+
+    def test_rows_that_are_not_dicts(self):
+        rows = [1, {'a': 2}, [3], None]
+        self.assertEqual(self._write(Format.CSV, rows), ',a\n1,\n,2\n[3],\n,\n')
+        self.assertEqual(self._write(Format.NDJSON, rows), '{"": 1}\n{"a": 2}\n{"": [3]}\n{"": null}\n')
+
+    def test_no_rows(self):
+        for output_format in (Format.NDJSON, Format.CSV, Format.TSV):
+            self.assertEqual(self._write(output_format, []), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import re
+import unittest
+
+from cliff_adaptive_table.adaptive_table import AdaptiveTable, Degradation
+from cliff_adaptive_table.table_updater import TableUpdater
+
+
+class _Screen(object):
+    # a terminal that understands the escape sequences written by TableUpdater
+    _TOKENS = re.compile(r'\033\[(\d*)([ABKJ])|\r|\n|[^\033\r\n]+')
+
+    def __init__(self):
+        self.lines = ['']
+        self._row = 0
+        self._column = 0
+
+    def write(self, text):
+        for match in self._TOKENS.finditer(text):
+            token, code = match.group(0), match.group(2)
+            if code == 'A':
+                self._row -= int(match.group(1))
+            elif code == 'B':
+                self._row += int(match.group(1))
+            elif code == 'K':
+                self.lines[self._row] = self.lines[self._row][:self._column]
+            elif code == 'J':
+                self.lines[self._row] = self.lines[self._row][:self._column]
+                del self.lines[self._row + 1:]
+            elif token == '\r':
+                self._column = 0
+            elif token == '\n':
+                self._row += 1
+                self._column = 0
+                if self._row == len(self.lines):
+                    self.lines.append('')
+            else:
+                line = self.lines[self._row].ljust(self._column)
+                self.lines[self._row] = line[:self._column] + token + line[self._column + len(token):]
+                self._column += len(token)
+
+    def text(self):
+        # the cursor is on the empty line below the table
+        return '\n'.join(self.lines[:-1])
+
+
+class TestTableUpdater(unittest.TestCase):
+    _WIDTH = 80
+
+    def setUp(self):
+        self.rows = [{'id': i, 'name': 'host-%d' % i, 'status': 'ok'} for i in range(5)]
+
+    def _new_table(self, modifiers=()):
+        table = AdaptiveTable(width=self._WIDTH, ttl=None)
+        table.parse_modifiers(list(modifiers))
+        table._get_terminal_size = lambda: (100, self._WIDTH)
+        return table
+
+    def _update(self, rows, modifiers=()):
+        # updates the screen with the rows, and checks that it shows the table that format() returns
+        text = self.updater.update(rows)
+        self.screen.write(text)
+        self.assertEqual(self.screen.text(), self._new_table(modifiers).format(rows))
+        return text
+
+    def _start(self, modifiers=()):
+        self.updater = TableUpdater(self._new_table(modifiers))
+        self.screen = _Screen()
+        self._update(self.rows, modifiers)
+
+    def test_changed_rows(self):
+        self._start()
+        rows = [dict(row) for row in self.rows]
+        rows[1]['status'] = 'error'
+        rows[3]['status'] = 'down'
+        text = self._update(rows)
+        self.assertNotIn('host-0', text)
+        self.assertIn('host-1', text)
+
+    def test_unchanged_rows(self):
+        self._start()
+        self.assertEqual(self._update([dict(row) for row in self.rows]), '')
+
+    def test_added_rows(self):
+        self._start()
+        self._update(self.rows[:2] + [{'id': 9, 'name': 'host-9', 'status': 'ok'}] + self.rows[2:])
+        self._update(self.rows + [{'id': 10, 'name': 'host-10', 'status': 'ok'}])
+
+    def test_removed_rows(self):
+        self._start()
+        self._update(self.rows[:1] + self.rows[2:])
+        self._update(self.rows[2:4])
+
+    def test_wider_rows(self):
+        self._start()
+        self._update(self.rows + [{'id': 5, 'name': 'a much longer name than the others', 'status': 'ok'}])
+
+    def test_modifiers_of_the_whole_table(self):
+        for modifiers in (['split-table=y'], ['transpose=y'], ['count=y']):
+            self._start(modifiers)
+            rows = [dict(row) for row in self.rows]
+            rows[1]['status'] = 'error'
+            self._update(rows, modifiers)
+            self._update(rows[1:], modifiers)
+
+    def test_one_row(self):
+        self._start()
+        self._update(self.rows[:1])
+        self._update(self.rows)
+
+    def test_update_after_a_degraded_table(self):
+        table = self._new_table()
+        table.format([{'column-%d' % index: 'value' for index in range(12)}] * 3)
+        self.assertEqual(table.get_degradation(), Degradation.NO_FIT)
+        self.updater = TableUpdater(table)
+        self.screen = _Screen()
+        self._update(self.rows)
+        self.assertEqual(table.get_degradation(), Degradation.NONE)
+
+
+if __name__ == '__main__':
+    unittest.main()